@@ -13,12 +13,35 @@ from .const import (
     CONF_ENERGY_METER_PERIOD,
     CONF_HQ_PLAN_NAME,
     CONF_TARIFF_PLAN,
+    CONF_MAX_CONCURRENT_UPDATES,
+    CONF_WRITE_DEBOUNCE,
+    CONF_POLL_INTERVALS,
+    CONF_MIN_POLL_INTERVAL,
+    CONF_MAX_POLL_INTERVAL,
+    CONF_PUSH_UPDATES,
+    CONF_READ_BACKEND,
+    CONF_TRANSPORT,
+    CONF_MQTT_PREFIX,
+    CONF_CHALLENGE_POLL_INTERVALS,
+    CHALLENGE_PHASES,
     DEFAULT_TARIFF_PLAN,
     DEFAULT_LIGHT_AS_SWITCH,
     MIN_SCAN_INTERVAL,
     DEFAULT_GENERATE_ENERGY_METERS,
     DEFAULT_ENERGY_METER_PERIOD,
     DEFAULT_HQ_PLAN_NAME,
+    DEFAULT_MAX_CONCURRENT_UPDATES,
+    DEFAULT_WRITE_DEBOUNCE,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_PUSH_UPDATES,
+    DEFAULT_READ_BACKEND,
+    READ_BACKENDS,
+    DEFAULT_TRANSPORT,
+    DEFAULT_MQTT_PREFIX,
+    TRANSPORTS,
+    SERVICE_SET_POLL_BUDGET,
+    ATTR_BUDGET,
 )
 import voluptuous as vol
 
@@ -60,9 +83,47 @@ CONFIG_SCHEMA = vol.Schema(
                     CONF_ENERGY_METER_PERIOD, default=DEFAULT_ENERGY_METER_PERIOD
                 ): cv.string,
                 vol.Optional(CONF_TARIFF_PLAN, default=DEFAULT_TARIFF_PLAN): cv.string,
+                vol.Optional(
+                    CONF_MAX_CONCURRENT_UPDATES, default=DEFAULT_MAX_CONCURRENT_UPDATES
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Optional(CONF_WRITE_DEBOUNCE, default=DEFAULT_WRITE_DEBOUNCE): (
+                    vol.All(vol.Coerce(float), vol.Range(min=0))
+                ),
                 vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): (
                     vol.All(cv.time_period, vol.Clamp(min=MIN_SCAN_INTERVAL))
                 ),
+                vol.Optional(CONF_POLL_INTERVALS, default={}): vol.Schema(
+                    {
+                        cv.string: vol.All(
+                            cv.time_period, vol.Clamp(min=MIN_SCAN_INTERVAL)
+                        )
+                    }
+                ),
+                vol.Optional(
+                    CONF_MIN_POLL_INTERVAL, default=DEFAULT_MIN_POLL_INTERVAL
+                ): vol.All(cv.time_period, vol.Clamp(min=MIN_SCAN_INTERVAL)),
+                vol.Optional(
+                    CONF_MAX_POLL_INTERVAL, default=DEFAULT_MAX_POLL_INTERVAL
+                ): vol.All(cv.time_period, vol.Clamp(min=MIN_SCAN_INTERVAL)),
+                vol.Optional(
+                    CONF_PUSH_UPDATES, default=DEFAULT_PUSH_UPDATES
+                ): cv.boolean,
+                vol.Optional(CONF_READ_BACKEND, default=DEFAULT_READ_BACKEND): vol.In(
+                    READ_BACKENDS
+                ),
+                vol.Optional(CONF_TRANSPORT, default=DEFAULT_TRANSPORT): vol.In(
+                    TRANSPORTS
+                ),
+                vol.Optional(CONF_MQTT_PREFIX, default=DEFAULT_MQTT_PREFIX): cv.string,
+                vol.Optional(CONF_CHALLENGE_POLL_INTERVALS, default={}): vol.Schema(
+                    {
+                        vol.In(CHALLENGE_PHASES): {
+                            cv.string: vol.All(
+                                cv.time_period, vol.Clamp(min=MIN_SCAN_INTERVAL)
+                            )
+                        }
+                    }
+                ),
             }
         ),
     },
@@ -81,11 +142,23 @@ async def async_setup(hass, config):
         await async_reload_integration_platforms(hass, DOMAIN, PLATFORMS)
         await _async_process_config(hass, conf)
 
+    async def set_poll_budget_handler(service):
+        if DOMAIN in hass.data:
+            hass.data[DOMAIN].poll_budget.set_override(service.data.get(ATTR_BUDGET))
+
     component = EntityComponent(_LOGGER, DOMAIN, hass)
     component.scan_interval = get_scan_interval(config)
     hass.services.async_register(
         DOMAIN, SERVICE_RELOAD, reload_service_handler, schema=vol.Schema({})
     )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SET_POLL_BUDGET,
+        set_poll_budget_handler,
+        schema=vol.Schema(
+            {vol.Optional(ATTR_BUDGET): vol.All(vol.Coerce(float), vol.Range(min=1))}
+        ),
+    )
     return await _async_process_config(hass, config)
 
 
@@ -101,6 +174,8 @@ async def _async_process_config(hass, config) -> bool:
     load_tasks = []
     username = conf.get(CONF_USERNAME, "no username")
     password = conf.get(CONF_PASSWORD, "no password")
+    if DOMAIN in hass.data:
+        await hass.data[DOMAIN].async_unload()
     hilo = Hilo(
         username,
         password,
@@ -111,13 +186,26 @@ async def _async_process_config(hass, config) -> bool:
         conf.get(CONF_ENERGY_METER_PERIOD, DEFAULT_ENERGY_METER_PERIOD),
         conf.get(CONF_HQ_PLAN_NAME, DEFAULT_HQ_PLAN_NAME),
         conf.get(CONF_TARIFF_PLAN, DEFAULT_TARIFF_PLAN),
+        conf.get(CONF_MAX_CONCURRENT_UPDATES, DEFAULT_MAX_CONCURRENT_UPDATES),
+        conf.get(CONF_WRITE_DEBOUNCE, DEFAULT_WRITE_DEBOUNCE),
+        conf.get(CONF_POLL_INTERVALS, {}),
+        conf.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL),
+        conf.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL),
+        conf.get(CONF_PUSH_UPDATES, DEFAULT_PUSH_UPDATES),
+        conf.get(CONF_READ_BACKEND, DEFAULT_READ_BACKEND),
+        conf.get(CONF_TRANSPORT, DEFAULT_TRANSPORT),
+        conf.get(CONF_MQTT_PREFIX, DEFAULT_MQTT_PREFIX),
+        conf.get(CONF_CHALLENGE_POLL_INTERVALS, {}),
     )
-    await hilo.async_update_all_devices()
     coordinator = _hilo_coordinator(hass, hilo)
+    hilo.coordinator = coordinator
     hass.data[DOMAIN] = hilo
+    await hilo.async_warm_up()
+    await hilo.transport.async_start()
     await asyncio.gather(coordinator.async_refresh())
     if not coordinator.last_update_success:
         _LOGGER.error("Hilo coordinator failed: " + str(coordinator.last_exception))
+        await hilo.async_unload()
         return False
     for platform in PLATFORMS:
         try:
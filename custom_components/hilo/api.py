@@ -1,30 +1,20 @@
 import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import partial
 import async_timeout
 import aiohttp
 import logging
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import callback as ha_callback
 from homeassistant.exceptions import HomeAssistantError
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_point_in_time
+from homeassistant.helpers.update_coordinator import UpdateFailed
 from homeassistant.util import Throttle
-from homeassistant.const import (
-    DEVICE_CLASS_ENERGY,
-    ATTR_UNIT_OF_MEASUREMENT,
-    ATTR_DEVICE_CLASS,
-)
-from homeassistant.components.utility_meter.const import (
-    SERVICE_SELECT_TARIFF,
-    DOMAIN as UTIL_METER_DOMAIN,
-    ATTR_TARIFF,
-)
-from homeassistant.components.recorder.const import DATA_INSTANCE
-from homeassistant.core import (
-    Context,
-    callback as ha_callback,
-)
+import homeassistant.util.dt as dt_util
 from datetime import datetime, timedelta
-from dateutil import tz
-import json
 import re
-from time import time
+from time import time, monotonic
 import urllib
 
 from .const import (
@@ -34,10 +24,60 @@ from .const import (
     DEFAULT_ENERGY_METER_PERIOD,
     DEFAULT_TARIFF_PLAN,
     DEFAULT_HQ_PLAN_NAME,
+    DEFAULT_MAX_CONCURRENT_UPDATES,
+    DEFAULT_WRITE_DEBOUNCE,
+    DEFAULT_API_RATE,
+    DEFAULT_API_BURST,
+    CACHE_TTLS,
+    DEFAULT_POLL_INTERVALS,
+    CHALLENGE_PROFILES,
+    POLL_MIN_TICK,
+    CYCLE_DEADLINE,
+    CLOUD_READ_TIMEOUT,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_PUSH_UPDATES,
+    DEFAULT_READ_BACKEND,
+    DEFAULT_TRANSPORT,
+    DEFAULT_MQTT_PREFIX,
+    ADAPTIVE_POLL_FACTOR,
+    VOLATILITY_ALPHA,
+    CADENCE_POLL_LAG,
+    POLL_BUDGET_MIN,
+    POLL_BUDGET_MAX,
+    POLL_BUDGET_STEP,
+    POLL_BUDGET_PERIOD,
+    POLL_LATENCY_TARGET,
+    POLL_ERROR_TARGET,
+    WRITE_CONFIRM_DELAY,
+    WRITE_CONFIRM_TIMEOUT,
     DOMAIN,
     CONF_HIGH_PERIODS,
-    CONF_TARIFF,
 )
+from .cache import NOT_MODIFIED, ConditionalValidators, ResponseCache
+from .decode import (
+    DeviceInfo,
+    Event,
+    GatewayInfo,
+    async_loads,
+    attribute_key,
+    decode_attributes,
+)
+from .graphql import GraphQLReader
+from .managers import TariffCalendar
+from .push import DeviceHubTransport
+from .resilience import CircuitBreakers, RetryPolicy
+from .scheduler import (
+    CadenceEstimator,
+    PRIORITY_EVENTS,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_POLL,
+    PollBudget,
+    PollScheduler,
+    RequestScheduler,
+)
+from .session import ConnectionStats, async_warm_up, create_session
+from .transport import MqttTransport, RestTransport
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -47,6 +87,108 @@ LOGGED_ATTRIBUTES = ['CurrentTemperature', 'TargetTemperature', 'Power', 'Heatin
 TARIF_TYPE_REX = re.compile(r'(sensor.hilo_energy_.*)_(low|medium|high)')
 
 
+class SingleFlight:
+    """Share a single in-flight call between the callers using the same key"""
+
+    def __init__(self):
+        self._in_flight = {}
+        self.requests = 0
+        self.joins = 0
+
+    @property
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "joins": self.joins,
+            "in_flight": len(self._in_flight),
+        }
+
+    async def run(self, key, func):
+        self.requests += 1
+        task = self._in_flight.get(key)
+        if task:
+            self.joins += 1
+        else:
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # A caller being cancelled must not cancel the call the others joined
+        return await asyncio.shield(task)
+
+
+def _matches(value, expected):
+    if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        try:
+            return abs(float(value) - expected) < 0.01
+        except (TypeError, ValueError):
+            return False
+    return str(value).lower() == str(expected).lower()
+
+
+def _chain(source, target):
+    """Settles target like source once it's done"""
+
+    def settle(source):
+        if target.done():
+            return
+        if source.cancelled():
+            target.cancel()
+        elif source.exception():
+            target.set_exception(source.exception())
+        else:
+            target.set_result(source.result())
+
+    source.add_done_callback(settle)
+
+
+class DeviceRegistry:
+    """Devices indexed by id, with secondary indexes by type and supported attribute"""
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_type = defaultdict(dict)
+        self._by_attribute = defaultdict(dict)
+        self._indexed_as = {}
+
+    def __iter__(self):
+        return iter(list(self._by_id.values()))
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, device):
+        return device.device_id in self._by_id
+
+    def get(self, device_id, default=None):
+        return self._by_id.get(device_id, default)
+
+    def add(self, device):
+        """Add or re-index a device, its type or attributes might have changed"""
+        self._unindex(device.device_id)
+        self._by_id[device.device_id] = device
+        self._by_type[device.device_type][device.device_id] = device
+        for attr in device.supported_attributes:
+            self._by_attribute[attr][device.device_id] = device
+        self._indexed_as[device.device_id] = (
+            device.device_type,
+            list(device.supported_attributes),
+        )
+
+    def _unindex(self, device_id):
+        if device_id not in self._indexed_as:
+            return
+        device_type, attributes = self._indexed_as.pop(device_id)
+        self._by_type[device_type].pop(device_id, None)
+        for attr in attributes:
+            self._by_attribute[attr].pop(device_id, None)
+
+    def of_type(self, *device_types):
+        return [d for t in device_types for d in self._by_type.get(t, {}).values()]
+
+    def with_attribute(self, attribute):
+        return list(self._by_attribute.get(attribute, {}).values())
+
+
 class Hilo:
     _username = None
     _password = None
@@ -61,7 +203,6 @@ class Hilo:
     _token_expiration = None
     _timeout = 30
     _verify = True
-    devices = []
 
     def __init__(
         self,
@@ -74,6 +215,16 @@ class Hilo:
         energy_meter_period=DEFAULT_ENERGY_METER_PERIOD,
         hq_plan_name=DEFAULT_HQ_PLAN_NAME,
         tariff_plan=DEFAULT_TARIFF_PLAN,
+        max_concurrent_updates=DEFAULT_MAX_CONCURRENT_UPDATES,
+        write_debounce=DEFAULT_WRITE_DEBOUNCE,
+        poll_intervals={},
+        min_poll_interval=DEFAULT_MIN_POLL_INTERVAL,
+        max_poll_interval=DEFAULT_MAX_POLL_INTERVAL,
+        push_updates=DEFAULT_PUSH_UPDATES,
+        read_backend=DEFAULT_READ_BACKEND,
+        transport=DEFAULT_TRANSPORT,
+        mqtt_prefix=DEFAULT_MQTT_PREFIX,
+        challenge_poll_intervals={},
     ):
         self._username = username
         self._password = urllib.parse.quote(password, safe="!@#$%^&*()")
@@ -84,16 +235,114 @@ class Hilo:
         self.energy_meter_period = energy_meter_period
         self.hq_plan_name = hq_plan_name
         self.tariff_plan = tariff_plan
-        self.async_update = Throttle(self.scan_interval)(self._async_update)
+        self.max_concurrent_updates = max_concurrent_updates
+        self.write_debounce = write_debounce
+        self.coordinator = None
+        self.event_active = False
+        self.event_phase = None
+        self._events = []
+        self._unsub_event_phase = None
+        self.device_refreshes = SingleFlight()
+        self.request_scheduler = RequestScheduler(DEFAULT_API_RATE, DEFAULT_API_BURST)
+        self.retry_policy = RetryPolicy()
+        self.breakers = CircuitBreakers()
+        self.response_cache = ResponseCache(CACHE_TTLS)
+        self.validators = ConditionalValidators()
+        self._location_urls = {}
+        self.devices = DeviceRegistry()
+        self.tariff_manager = None
+        self.tariff_calendar = TariffCalendar(CONF_HIGH_PERIODS)
+        self.poll_intervals = {**DEFAULT_POLL_INTERVALS, **poll_intervals}
+        self.challenge_poll_intervals = {
+            phase: {**profile["intervals"], **challenge_poll_intervals.get(phase, {})}
+            for phase, profile in CHALLENGE_PROFILES.items()
+        }
+        self.poll_scheduler = PollScheduler()
+        self.poll_budget = PollBudget(
+            POLL_BUDGET_MIN,
+            POLL_BUDGET_MAX,
+            POLL_LATENCY_TARGET,
+            POLL_ERROR_TARGET,
+            POLL_BUDGET_STEP,
+            POLL_BUDGET_PERIOD,
+        )
+        self.poll_stretch = 1
+        self.graphql = GraphQLReader(self) if read_backend == "graphql" else None
+        self.connection_stats = ConnectionStats()
+        self._session = None
+        self._unsub_close = None
+        if transport == "mqtt":
+            self.transport = MqttTransport(self, mqtt_prefix)
+        elif push_updates:
+            self.transport = DeviceHubTransport(self)
+        else:
+            self.transport = RestTransport(self)
+        self.transport.async_subscribe(self._async_on_push)
+        self.min_poll_interval = min_poll_interval.total_seconds()
+        self.max_poll_interval = max(
+            max_poll_interval.total_seconds(), self.min_poll_interval
+        )
+        self._devices_payload = None
         self.refresh_token = Throttle(timedelta(seconds=120))(self._refresh_token)
         self.current_cost = float(0.0000)
 
+    async def async_unload(self):
+        if self.tariff_manager:
+            self.tariff_manager.async_stop()
+        if self._unsub_event_phase:
+            self._unsub_event_phase()
+            self._unsub_event_phase = None
+        await self.transport.async_stop()
+        await self._async_close_session()
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = create_session(self._verify, self.connection_stats)
+            if not self._unsub_close:
+                self._unsub_close = self._hass.bus.async_listen_once(
+                    EVENT_HOMEASSISTANT_CLOSE, self._async_on_close
+                )
+        return self._session
+
+    async def async_warm_up(self):
+        await async_warm_up(self.session, self._timeout)
+
+    async def _async_on_close(self, event):
+        self._unsub_close = None
+        await self._async_close_session()
+
+    async def _async_close_session(self):
+        if self._unsub_close:
+            self._unsub_close()
+            self._unsub_close = None
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    @ha_callback
+    def _async_on_push(self, device_id, attributes):
+        device = self.devices.get(device_id)
+        # Not known yet, it's read along with the device list
+        if device:
+            device.async_apply_push(attributes)
+
+    @ha_callback
+    def async_push_state_changed(self):
+        """The devices are polled at a different pace when the device hub
+        (dis)connects, reschedule them right away"""
+        devices = [d for d in self.devices if d.device_type != "Gateway"]
+        self.poll_scheduler.stagger(devices, monotonic(), self.poll_interval)
+        self._schedule_next_cycle()
+
     async def location_url(self, gd=False):
-        self._location_id = await self.get_location_id()
-        base = self._automation_url
-        if gd:
-            base = self._gd_service_url
-        return f"{base}/Locations/{self._location_id}"
+        if gd not in self._location_urls:
+            self._location_id = await self.get_location_id()
+            base = self._automation_url
+            if gd:
+                base = self._gd_service_url
+            self._location_urls[gd] = f"{base}/Locations/{self._location_id}"
+        return self._location_urls[gd]
 
     @property
     def headers(self):
@@ -103,67 +352,151 @@ class Hilo:
         }
 
     @property
-    def high_times(self):
-        for period, data in CONF_HIGH_PERIODS.items():
-            if data["from"] <= datetime.now().time() <= data["to"]:
-                return True
-        return False
+    def diagnostics(self):
+        return {
+            "device_refreshes": self.device_refreshes.stats,
+            "request_scheduler": self.request_scheduler.stats,
+            "retries": self.retry_policy.stats,
+            "breakers": self.breakers.stats,
+            "response_cache": self.response_cache.stats,
+            "conditional_gets": self.validators.stats,
+            "poll_scheduler": self.poll_scheduler.stats,
+            "poll_budget": self.poll_budget.stats,
+            "poll_stretch": round(self.poll_stretch, 2),
+            "graphql": self.graphql.stats if self.graphql else None,
+            "transport": self.transport.stats,
+            "connections": self.connection_stats.stats,
+            "poll_intervals": {
+                d._tag: round(self.poll_interval(d)) for d in self.devices
+            },
+        }
 
-    async def async_call(self, url, method="get", headers={}, data={}, allowed_status=[200], retry=3):
-        async def try_again(err: str):
-            if retry < 1:
-                _LOGGER.error(f"Unable to {method} {url}: {err}")
-                raise HomeAssistantError("Retry limit reached")
-            _LOGGER.error(f"Retry #{retry - 1}: {err}")
-            return await self.async_call(
-                url, method=method, headers=headers, data=data, retry=retry - 1
-            )
+    @property
+    def high_times(self):
+        return self.tariff_calendar.is_high(dt_util.now())
 
-        # _LOGGER.debug(f"Request {method} {url}")
+    async def async_call(self, url, *args, **kwargs):
+        breaker = self.breakers.for_url(url)
+        breaker.before_call()
         try:
-            session = async_get_clientsession(self._hass, self._verify)
-            with async_timeout.timeout(self._timeout):
-                resp = await getattr(session, method)(url, headers=headers, data=data)
-            _LOGGER.debug(f"Response: {resp.status} {resp.text}")
-            if resp.status == 401:
-                if "oauth2" not in url:
+            out = await self._async_call(url, *args, **kwargs)
+        except HomeAssistantError:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record_success()
+        return out
+
+    async def _async_call(
+        self,
+        url,
+        method="get",
+        headers={},
+        data={},
+        allowed_status=[200],
+        retry=None,
+        priority=None,
+        conditional=False,
+    ):
+        attempts = self.retry_policy.attempts if retry is None else retry
+        attempt = 0
+        while True:
+            # _LOGGER.debug(f"Request {method} {url}")
+            if priority is not None:
+                await self.request_scheduler.acquire(priority)
+            retry_after = None
+            request_headers = headers
+            if conditional:
+                request_headers = {**headers, **self.validators.headers(url)}
+            start = monotonic()
+            try:
+                session = self.session
+                with async_timeout.timeout(self._timeout):
+                    resp = await getattr(session, method)(
+                        url, headers=request_headers, data=data
+                    )
+                self.poll_budget.record(monotonic() - start, resp.status, resp.headers)
+                _LOGGER.debug(f"Response: {resp.status} {resp.text}")
+                if conditional and resp.status == 304:
+                    self.validators.not_modified += 1
+                    return NOT_MODIFIED
+                if resp.status == 401:
+                    if "oauth2" in url:
+                        _LOGGER.error(
+                            "Access denied when refreshing token, unloading integration. Bad username / password"
+                        )
+                        self._hass.services.async_remove(DOMAIN)
+                        raise HomeAssistantError("Wrong username / password")
                     await self.refresh_token(True)
-                    return await try_again(f"{resp.url} Token is expired, trying again")
-                else:
-                    _LOGGER.error(
-                        "Access denied when refreshing token, unloading integration. Bad username / password"
+                    headers = {**headers, **self.headers}
+                    # No need to wait, the new token is used right away
+                    retry_after = 0
+                    err = f"{resp.url} Token is expired, trying again"
+                elif resp.status not in allowed_status:
+                    _LOGGER.error(f"{method} on {url} failed: {resp.status} {resp.text}")
+                    retry_after = self.retry_policy.parse_retry_after(
+                        resp.headers.get("Retry-After")
                     )
-                    self._hass.services.async_remove(DOMAIN)
-                    raise HomeAssistantError("Wrong username / password")
-            if resp.status not in allowed_status:
-                _LOGGER.error(f"{method} on {url} failed: {resp.status} {resp.text}")
-                return await try_again(f"{url} returned {resp.status}")
-        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
-            _LOGGER.error(f"{method} {url} failed")
-            _LOGGER.exception(err)
-            return await try_again(err)
-        try:
-            data = await resp.json()
-            #_LOGGER.debug(f"Raw response dict: {data}")
-        except aiohttp.client_exceptions.ContentTypeError:
-            _LOGGER.warning(f"{resp.url} returned {resp.status} non-json: {resp.text}")
-            return resp.text
-        except Exception as e:
-            _LOGGER.exception(e)
-            return await try_again(f"{resp.url} returned {resp.status}: {resp.text}")
-        return data
+                    err = f"{url} returned {resp.status}"
+                elif conditional:
+                    raw = await resp.read()
+                    if self.validators.unchanged(url, resp.headers, raw):
+                        return NOT_MODIFIED
+                    try:
+                        return await async_loads(self._hass, raw)
+                    except ValueError as e:
+                        self.validators.forget(url)
+                        err = f"{resp.url} returned {resp.status} non-json: {e}"
+                else:
+                    raw = await resp.read()
+                    try:
+                        return await async_loads(self._hass, raw)
+                    except ValueError:
+                        text = raw.decode(errors="replace")
+                        _LOGGER.warning(f"{resp.url} returned {resp.status} non-json: {text}")
+                        return text
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                self.poll_budget.record(monotonic() - start)
+                _LOGGER.error(f"{method} {url} failed")
+                _LOGGER.exception(e)
+                err = e
+            attempt += 1
+            if attempt > attempts:
+                self.retry_policy.exhausted += 1
+                _LOGGER.error(f"Unable to {method} {url}: {err}")
+                raise HomeAssistantError("Retry limit reached")
+            delay = self.retry_policy.delay(attempt, retry_after)
+            _LOGGER.error(f"Retry #{attempt} in {delay:.1f}s: {err}")
+            await asyncio.sleep(delay)
 
-    async def _request(self, url, method="get", headers={}, data={}):
+    async def _request(
+        self, url, method="get", headers={}, data={}, priority=None, conditional=False
+    ):
+        if method == "get" and not conditional:
+            cached = self.response_cache.get(url)
+            if cached is not None:
+                return cached
         await self.refresh_token()
         if not headers:
             headers = self.headers
         if method == "put":
             headers = {**headers, **{"Content-Type": "application/json"}}
+        if priority is None:
+            priority = PRIORITY_POLL if method == "get" else PRIORITY_INTERACTIVE
         try:
-            out = await self.async_call(url, method, headers, data)
+            out = await self.async_call(
+                url, method, headers, data, priority=priority, conditional=conditional
+            )
         except HomeAssistantError as e:
             _LOGGER.exception(e)
             raise
+        if out is NOT_MODIFIED:
+            return out
+        # Writes only touch device attributes, which are never cached
+        if method == "get":
+            self.response_cache.set(url, out)
         return out
 
     async def get_access_token(self):
@@ -204,12 +537,12 @@ class Hilo:
         if self._location_id:
             return self._location_id
         url = f"{self._automation_url}/Locations"
-        req = await self._request(url)
+        req = await self._request(url, priority=PRIORITY_EVENTS)
         return req[0]["id"]
 
     async def get_gateway(self):
         url = f"{await self.location_url()}/Gateways/Info"
-        req = await self._request(url)
+        req = await self._request(url, priority=PRIORITY_EVENTS)
         # [
         #   {
         #     "onlineStatus": "Online",
@@ -230,23 +563,27 @@ class Hilo:
             "onlineStatus"
         ]
 
+        info = GatewayInfo.from_payload(req[0])
         gw = {
             "name": "hilo_gateway",
-            "Disconnected": {
-                "value": not req[0].get("onlineStatus") == "Online"
-            },
+            "Disconnected": {"value": not info.online_status == "Online"},
             "type": "Gateway",
             "supportedAttributes": ", ".join(saved_attrs),
             "settableAttributes": "",
             "id": self._location_id,
             "category": "Gateway",
         }
-        for attr in saved_attrs:
-            gw[attr] = {"value": req[0].get(attr)}
+        values = [
+            info.zigbee_pairing_activated,
+            info.zigbee_channel,
+            info.firmware_version,
+            info.online_status,
+        ]
+        for attr, value in zip(saved_attrs, values):
+            gw[attr] = {"value": value, "timeStampUTC": info.last_status_time}
         return gw
 
     async def get_events(self):
-        # TODO(dvd): Leveraging the phases
         # [{
         #     'progress': 'inProgress',
         #     'isParticipating': True,
@@ -263,56 +600,262 @@ class Hilo:
         #     }
         # }]
         url = f"{await self.location_url(True)}/Events?active=true"
-        req = await self._request(url)
+        req = await self._request(url, priority=PRIORITY_EVENTS)
         _LOGGER.debug(f"Events: {req}")
-        from_zone = tz.tzutc()
-        to_zone = tz.tzlocal()
-        now = datetime.now()
+        self._events = [Event.from_payload(e) for e in req]
         current_event = False
-        if len(req):
-            if req[0].get('progress', "NotInProgress") == "inProgress":
+        if len(self._events):
+            if self._events[0].progress == "inProgress":
                 current_event = True
-        #for r in req:
-        #    start_time = datetime.strptime(r.get("reductionStartDateUTC"), "%Y-%m-%dT%H:%M:%SZ")\
-        #                       .replace(tzinfo=from_zone)\
-        #                       .astimzone(to_zone)
-        #    end_time = datetime.strptime(r.get("reductionEndDateUTC"), "%Y-%m-%dT%H:%M:%SZ")\
-        #                       .replace(tzinfo=from_zone)\
-        #                       .astimzone(to_zone)
-        #    if start_time <= now <= end_time:
-        #        _LOGGER.info(f"Hilo event currently active: {r}")
-        #        current_event = True
         return current_event
 
-    def get_dev_or_new(self, v):
-        return next(
-            (x for x in self.devices if x.device_id == v["id"]), Device(self)
-        )
- 
+    def _event_phases(self):
+        """(start, end, phase) of the phases of the events we take part in"""
+        return [phase for e in self._events if e.participating for phase in e.phases]
+
+    @ha_callback
+    def _async_update_event_phase(self):
+        """Switch to the polling profile of the current challenge phase and
+        wake up at the next phase boundary"""
+        now = dt_util.utcnow()
+        phase = None
+        next_boundary = None
+        for start, end, name in self._event_phases():
+            if start <= now < end:
+                phase = name
+            for boundary in (start, end):
+                if boundary > now and (next_boundary is None or boundary < next_boundary):
+                    next_boundary = boundary
+        if self._unsub_event_phase:
+            self._unsub_event_phase()
+            self._unsub_event_phase = None
+        if next_boundary:
+            self._unsub_event_phase = async_track_point_in_time(
+                self._hass, self._async_event_phase_boundary, next_boundary
+            )
+        if phase == self.event_phase:
+            return False
+        _LOGGER.info(f"Hilo challenge phase changed from {self.event_phase} to {phase}")
+        self.event_phase = phase
+        profile = CHALLENGE_PROFILES.get(phase, {})
+        self.request_scheduler.set_rate(profile.get("api_rate", DEFAULT_API_RATE))
+        # The devices polled faster during this phase shouldn't wait for
+        # their current schedule
+        faster = self.devices.of_type(*self.challenge_poll_intervals.get(phase, {}))
+        self.poll_scheduler.stagger(faster, monotonic(), self.poll_interval)
+        return True
+
+    @ha_callback
+    def _async_event_phase_boundary(self, now):
+        self._unsub_event_phase = None
+        if not self._async_update_event_phase():
+            return
+        for d in self.devices.of_type("Meter"):
+            d.async_notify()
+        if self.coordinator:
+            self._hass.async_create_task(self.coordinator.async_request_refresh())
+
+    def get_dev_or_new(self, info):
+        return self.devices.get(info.id) or Device(self)
+
     async def add_device(self, v):
-        device = self.get_dev_or_new(v)
-        await device._set_hilo_attributes(**v)
-        if not device in self.devices:
-            self.devices.append(device)
+        info = DeviceInfo.from_payload(v)
+        device = self.get_dev_or_new(info)
+        device._set_hilo_attributes(info)
+        self.devices.add(device)
  
     async def get_devices(self):
         """Get list of all devices"""
-        url = f"{await self.location_url()}/Devices"
-        req = await self._request(url)
-        for i, v in enumerate(req):
-            await self.add_device(v)
-        await self.add_device(await self.get_gateway())
-
-    async def _async_update(self):
-        # self.get_events()
-        _LOGGER.info("Pulling all devices")
-        await self.get_devices()
-
-    async def async_update_all_devices(self):
-        _LOGGER.info("Updating attributes for all devices")
-        await self.get_devices()
-        for d in self.devices:
-            await d.async_update_device()
+        req = await self.transport.async_list_devices()
+        # Same cached response, the devices are already up to date
+        if req is not self._devices_payload:
+            for i, v in enumerate(req):
+                await self.add_device(v)
+            self._devices_payload = req
+        if not self.transport.local:
+            await self.add_device(await self.get_gateway())
+            return
+        # The local devices don't wait for the cloud, the gateway is only
+        # read when it answers in time
+        try:
+            gateway = await asyncio.wait_for(
+                self.get_gateway(), CLOUD_READ_TIMEOUT.total_seconds()
+            )
+        except (asyncio.TimeoutError, HomeAssistantError) as e:
+            _LOGGER.warning(f"Unable to read the gateway: {e!r}")
+            return
+        await self.add_device(gateway)
+
+    def poll_interval(self, device):
+        """Seconds between two refreshes of the device"""
+        if self.transport.pushes and device.device_type != "Gateway":
+            # Only to catch what the pushes could have missed
+            return self.max_poll_interval
+        return self._base_poll_interval(device) * self.poll_stretch
+
+    def _base_poll_interval(self, device):
+        interval = self.challenge_poll_intervals.get(self.event_phase, {}).get(
+            device.device_type
+        )
+        if interval is not None:
+            # Polling too fast could get the account suspended
+            return max(interval.total_seconds(), self.min_poll_interval)
+        interval = self.poll_intervals.get(device.device_type, self.scan_interval)
+        interval = interval.total_seconds()
+        if device.volatility is None:
+            return interval
+        # Geometric interpolation between the bounds, a device that changes
+        # on half of its refreshes keeps the interval of its type
+        low = min(max(interval / ADAPTIVE_POLL_FACTOR, self.min_poll_interval), interval)
+        high = max(min(interval * ADAPTIVE_POLL_FACTOR, self.max_poll_interval), interval)
+        return low * (high / low) ** (1 - device.volatility)
+
+    async def async_update(self):
+        """Coordinator cycle, refreshes the devices that are due and returns
+        the ids of the devices that changed"""
+        deadline = monotonic() + CYCLE_DEADLINE.total_seconds()
+        try:
+            await asyncio.wait_for(self.get_devices(), deadline - monotonic())
+        except (asyncio.TimeoutError, HomeAssistantError) as e:
+            if not len(self.devices):
+                raise UpdateFailed(f"Unable to get devices: {e!r}")
+            _LOGGER.warning(f"Unable to get devices, using the known ones: {e!r}")
+        events_timeout = max(0, deadline - monotonic())
+        if self.transport.local:
+            events_timeout = min(events_timeout, CLOUD_READ_TIMEOUT.total_seconds())
+        try:
+            event_active = await asyncio.wait_for(self.get_events(), events_timeout)
+        except (asyncio.TimeoutError, HomeAssistantError) as e:
+            _LOGGER.error(f"Unable to get events: {e!r}")
+            event_active = self.event_active
+        phase_changed = self._async_update_event_phase()
+        self._update_poll_stretch()
+        now = monotonic()
+        new = [d for d in self.devices if d.device_id not in self.poll_scheduler]
+        due = [self.devices.get(i) for i in self.poll_scheduler.pop_due(now)]
+        due = [d for d in due if d]
+        if self.graphql:
+            try:
+                await asyncio.wait_for(
+                    self.graphql.async_prefetch(due + new), max(0, deadline - monotonic())
+                )
+            except asyncio.TimeoutError:
+                _LOGGER.warning("GraphQL read timed out, falling back to REST")
+        results = await self.async_update_devices(
+            due + new, max(0, deadline - monotonic())
+        )
+        if self.graphql:
+            # Not taken by the devices that joined a refresh in flight
+            self.graphql.clear()
+        for d in due:
+            self.poll_scheduler.schedule(d.device_id, self._next_poll(d, now))
+        # From the end of the cycle, the first refresh of a large install
+        # takes a while and the slots it covered would already be due
+        self.poll_scheduler.stagger(new, monotonic(), self.poll_interval)
+        self._schedule_next_cycle()
+        changed = {device_id for device_id, updated in results.items() if updated}
+        if event_active != self.event_active or phase_changed:
+            self.event_active = event_active
+            changed.update(
+                d.device_id for d in self.devices if d.name == "SmartEnergyMeter"
+            )
+        _LOGGER.debug(f"Devices changed during this cycle: {changed}")
+        return changed
+
+    def _update_poll_stretch(self):
+        """Stretch the poll intervals when the devices need more polls than
+        the budget allows"""
+        self.poll_budget.adjust()
+        demand = sum(60 / self._base_poll_interval(d) for d in self.devices)
+        stretch = self.poll_budget.stretch(demand)
+        if stretch != self.poll_stretch:
+            _LOGGER.info(
+                f"{demand:.1f} polls per minute needed for a budget of "
+                f"{self.poll_budget.current:.1f}, poll intervals stretched by {stretch:.2f}"
+            )
+        self.poll_stretch = stretch
+
+    def _next_poll(self, device, now):
+        """Monotonic time of the next refresh of a device.
+
+        When we know its cadence, the poll is moved earlier to land right
+        after the last backend refresh expected within its interval, never
+        later than the interval.
+        """
+        interval = self.poll_interval(device)
+        period = device.cadence.period
+        if period is None:
+            return now + interval
+        wall = time()
+        expected = device.cadence.next_refresh(wall + interval - CADENCE_POLL_LAG - period)
+        delay = expected + CADENCE_POLL_LAG - wall
+        if not 0 < delay <= interval:
+            return now + interval
+        return now + delay
+
+    def _schedule_next_cycle(self):
+        """Wake the coordinator up when the next device is due"""
+        if not self.coordinator:
+            return
+        next_due = self.poll_scheduler.next_due()
+        longest = self.scan_interval.total_seconds()
+        delay = longest if next_due is None else next_due - monotonic()
+        delay = min(max(delay, POLL_MIN_TICK.total_seconds()), longest)
+        self.coordinator.update_interval = timedelta(seconds=delay)
+
+    async def _async_update_device_timed(self, semaphore, device):
+        async with semaphore:
+            start = monotonic()
+            try:
+                return await device.async_update_device()
+            finally:
+                device.last_update_duration = round(monotonic() - start, 3)
+
+    async def async_update_devices(self, devices, timeout=None):
+        """Refresh the attributes of devices, max_concurrent_updates at a time.
+
+        A device that fails to update, or is still updating after timeout
+        seconds, keeps its previous values and is marked stale until it
+        answers. Returns {device_id: changed}, where a device that became
+        stale or fresh again counts as changed.
+        """
+        if not devices:
+            return {}
+        semaphore = asyncio.Semaphore(self.max_concurrent_updates)
+        start = monotonic()
+        was_stale = {d.device_id for d in devices if d.stale}
+        tasks = {
+            asyncio.ensure_future(self._async_update_device_timed(semaphore, d)): d
+            for d in devices
+        }
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        updated = {}
+        for task, d in tasks.items():
+            if task in pending:
+                _LOGGER.warning(f"{d._tag} Still updating after {timeout:.0f}s, marking as stale")
+                # The refresh keeps going, its values are published when it ends
+                task.add_done_callback(partial(self._async_late_update, d))
+            elif task.exception():
+                _LOGGER.error(f"{d._tag} Unable to update device: {task.exception()}")
+            else:
+                updated[d.device_id] = task.result() or d.device_id in was_stale
+                continue
+            if not d.stale:
+                d.stale = True
+                updated[d.device_id] = True
+        timings = {d.name: d.last_update_duration for d in devices}
+        _LOGGER.debug(
+            f"Updated {sum(1 for d in devices if not d.stale)}/{len(devices)} devices in "
+            f"{monotonic() - start:.3f}s: {timings}"
+        )
+        return updated
+
+    @ha_callback
+    def _async_late_update(self, device, task):
+        if task.cancelled() or task.exception():
+            return
+        _LOGGER.debug(f"{device._tag} Late update done after {device.last_update_duration}s")
+        device.async_notify()
 
     def set_state(self, entity, state, new_attrs={}, keep_state=False, force=False):
         params = f"entity={entity}, state={state}, new_attrs={new_attrs}, keep_state={keep_state}"
@@ -335,138 +878,345 @@ class Hilo:
             attrs["Cost"] = state
         self._hass.states.async_set(entity, state, attrs)
 
-    def check_tarif(self):
-        tarif = "low"
-        base_sensor = "sensor.hilo_energy_total_daily_low"
-        energy_used = self._hass.states.get(base_sensor)
-        if not energy_used:
-            _LOGGER.warning(f"check_tarif: Unable to find state for {base_sensor}")
-            return tarif
-        plan_name = self.hq_plan_name
-        tarif_config = CONF_TARIFF.get(plan_name)
-        current_cost = self._hass.states.get("sensor.hilo_rate_current")
-        try:
-            if float(energy_used.state) >= tarif_config.get("low_threshold"):
-                tarif = "medium"
-        except ValueError:
-            _LOGGER.warning(f"Unable to restore a valid state of {base_sensor}: {energy_used.state}")
-            pass
-        if tarif_config.get("high") > 0 and self.high_times:
-            tarif = "high"
-        target_cost = self._hass.states.get(f"sensor.hilo_rate_{tarif}")
-        if target_cost.state != current_cost.state:
-            _LOGGER.debug(
-                f"check_tarif: Updating current cost, was {current_cost.state} now {target_cost.state}"
-            )
-            self.set_state("sensor.hilo_rate_current", target_cost.state)
-        _LOGGER.debug(
-            f"check_tarif: Current plan: {plan_name} Target Tarif: {tarif} Energy used: {energy_used.state} Peak: {self.high_times}"
-        )
-        utility_entities = {}
-        for state in self._hass.states.async_all():
-            entity = state.entity_id
-            self.set_tarif(entity, state.state, tarif)
-            if not entity.startswith("sensor.hilo_energy") or entity.endswith("_cost"):
-                continue
-            self.fix_utility_sensor(entity, state)
-
-    @ha_callback
-    def fix_utility_sensor(self, entity, state):
-        """not sure why this doesn't get created with a proper device_class"""
-        current_state = state.as_dict()
-        attrs = current_state.get("attributes", {})
-        if not attrs.get("source"):
-            _LOGGER.debug(f"No source entity defined on {entity}: {current_state}")
-            return
-        parent_unit = self._hass.states.get(attrs.get("source"))
-        if not parent_unit:
-            _LOGGER.warning(f"Unable to find state for parent unit: {current_state}")
-            return
-        new_attrs = {
-            ATTR_UNIT_OF_MEASUREMENT: parent_unit.as_dict()
-            .get("attributes", {})
-            .get(ATTR_UNIT_OF_MEASUREMENT),
-            ATTR_DEVICE_CLASS: DEVICE_CLASS_ENERGY,
-        }
-        if not all(a in attrs.keys() for a in new_attrs.keys()):
-            _LOGGER.warning(
-                f"Fixing utility sensor: {entity} {current_state} new_attrs: {new_attrs}"
-            )
-            self.set_state(entity, None, new_attrs=new_attrs, keep_state=True)
-
-    @ha_callback
-    def set_tarif(self, entity, current, new):
-        if entity.startswith("utility_meter.hilo_energy") and current != new:
-            _LOGGER.debug(
-                f"check_tarif: Changing tarif of {entity} from {current} to {new}"
-            )
-            context = Context()
-            data = {ATTR_TARIFF: new, "entity_id": entity}
-            self._hass.async_create_task(
-                self._hass.services.async_call(
-                    UTIL_METER_DOMAIN, SERVICE_SELECT_TARIFF, data, context=context
-                )
-            )
-
 
 class Device:
     def __init__(self, hilo):
         self._h = hilo
         self._entity = None
+        self.last_update_duration = None
+        self.volatility = None
+        self.stale = False
+        self.cadence = CadenceEstimator()
+        self._refreshed = False
+        self._raw_attributes = {}
+        self._pending_writes = {}
+        self._write_future = None
+        self._write_handle = None
+        # Open transactions by task, with the writes they queued
+        self._transactions = {}
+        self._optimistic = {}
+        self._listeners = []
 
-    async def _set_hilo_attributes(self, **kw):
-        self.name = kw.get("name")
-        self.device_type = kw.get("type")
-        self.supported_attributes = kw.get("supportedAttributes").split(", ")
-        self.settable_attributes = kw.get("settableAttributes")
-        self.device_id = kw.get("id")
-        self.category = kw.get("category")
+    def _set_hilo_attributes(self, info):
+        self.name = info.name
+        self.device_type = info.type
+        self.supported_attributes = info.supported_attributes
+        self.settable_attributes = info.settable_attributes
+        self.device_id = info.id
+        self.category = info.category
         self._tag = f"[Device {self.name} ({self.device_type})]"
-        self._device_url = f"{await self._h.location_url()}/Devices/{self.device_id}"
-        self._raw_attributes = {}
-        _LOGGER.debug(f"{self._tag} Setting attributes {kw}")
-        # All devices like SmokeDetectors don't have the disconnected attribute
-        # but it can be fetched
-        if "Disconnected" not in self.supported_attributes:
-            self.supported_attributes.append("Disconnected")
-        if "None" in self.supported_attributes:
-            self.supported_attributes.remove("None")
+        _LOGGER.debug(f"{self._tag} Setting attributes {info}")
 
     async def get_device_attributes(self):
-        if self.device_type == "Gateway":
-            req = await self._h.get_gateway()
-        else:
-            url = f"{self._device_url}/Attributes"
-            req = await self._h._request(url)
-        if len(req.items()):
-            self._raw_attributes = {k.lower(): v for k, v in req.items()}
-            _LOGGER.debug(f"{self._tag} get_device_attributes (raw): {self._raw_attributes}")
-        else:
+        """Returns False when the attributes didn't change since the last call"""
+        prefetched = self._h.graphql.take(self.device_id) if self._h.graphql else None
+        if prefetched:
+            # Only the rendered attributes were read, keep the others
+            raw = {**self._raw_attributes, **prefetched}
+            if raw == self._raw_attributes:
+                return False
+            self._raw_attributes = raw
+            return True
+        policy = self._h.retry_policy
+        attempt = 0
+        while True:
+            if self.device_type == "Gateway":
+                req = await self._h.get_gateway()
+            else:
+                # With nothing to compare to, get the full payload
+                req = await self._h.transport.async_read_attributes(
+                    self, full=not self._raw_attributes
+                )
+            if req is NOT_MODIFIED:
+                if len(self._raw_attributes):
+                    _LOGGER.debug(f"{self._tag} Attributes not modified")
+                    return False
+                continue
+            if len(req.items()):
+                self._raw_attributes = decode_attributes(req)
+                _LOGGER.debug(f"{self._tag} get_device_attributes (raw): {self._raw_attributes}")
+                return True
             _LOGGER.debug(f"{self._tag} Empty data returned by hilo")
-            if len(self._raw_attributes) == 0:
-                _LOGGER.debug("Retrying to get attributes")
-                await self.get_device_attributes()
+            if len(self._raw_attributes):
+                return False
+            attempt += 1
+            if attempt > policy.attempts:
+                policy.exhausted += 1
+                _LOGGER.warning(f"{self._tag} Still no attributes after {attempt} attempts")
+                return False
+            delay = policy.delay(attempt)
+            _LOGGER.debug(f"Retrying to get attributes in {delay:.1f}s")
+            await asyncio.sleep(delay)
 
-    async def set_attribute(self, key, value):
+    def queue_attribute(self, key, value):
+        """Queue a write, returns a future resolved once it's acknowledged.
+
+        Writes are sent in a single PUT once nothing was queued on the
+        device for write_debounce seconds and no transaction is open. The
+        latest value of an attribute wins and all the callers share the
+        same future. Within a transaction, the write is held by the
+        transaction until it ends.
+        """
+        loop = asyncio.get_running_loop()
         if self.device_type == "Gateway":
-            return
-        _LOGGER.debug(f"{self._tag} setting remote attribute {key} to {value}")
+            future = loop.create_future()
+            future.set_result(None)
+            return future
         setattr(self, key, value)
-        url = f"{self._device_url}/Attributes"
-        await self._h._request(url, method="put", data=json.dumps({key: str(value)}))
+        transaction = self._transactions.get(asyncio.current_task())
+        if transaction:
+            writes, future = transaction
+            writes[key] = value
+            return future
+        return self._queue_writes({key: value})
+
+    def _queue_writes(self, attributes):
+        self._pending_writes.update(attributes)
+        if self._write_future is None:
+            self._write_future = asyncio.get_running_loop().create_future()
+        if not self._transactions:
+            self._schedule_flush()
+        return self._write_future
 
-    async def async_update_device(self):
-        await self.get_device_attributes()
+    def _schedule_flush(self):
+        if self._write_handle:
+            self._write_handle.cancel()
+        self._write_handle = asyncio.get_running_loop().call_later(
+            self._h.write_debounce, self._flush_writes
+        )
+
+    def _flush_writes(self):
+        self._write_handle = None
+        # Sent when the last transaction ends
+        if self._transactions or not self._pending_writes:
+            return
+        attributes, self._pending_writes = self._pending_writes, {}
+        future, self._write_future = self._write_future, None
+        self._h._hass.async_create_task(
+            self._async_write_attributes(attributes, future)
+        )
+
+    async def _async_write_attributes(self, attributes, future):
+        _LOGGER.debug(f"{self._tag} setting remote attributes {attributes}")
+        try:
+            await self._h.transport.async_write_attributes(self, attributes)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Attributes queued in the block are sent together in a single PUT.
+
+        The writes of the device are held until the outermost transaction
+        of the task ends, which then waits for its attributes to be
+        acknowledged. When the block raises, the attributes it queued are
+        not sent and go back to their previous value, the writes queued by
+        other callers are kept.
+        """
+        task = asyncio.current_task()
+        if task in self._transactions:
+            # Nested, the outermost transaction sends the writes
+            yield self
+            return
+        writes = {}
+        future = asyncio.get_running_loop().create_future()
+        self._transactions[task] = (writes, future)
+        try:
+            yield self
+        except BaseException:
+            del self._transactions[task]
+            future.cancel()
+            self._discard_writes(writes)
+            raise
+        del self._transactions[task]
+        if not writes:
+            future.cancel()
+            # Held while the transaction was open
+            if self._pending_writes and not self._transactions:
+                self._schedule_flush()
+            return
+        _chain(self._queue_writes(writes), future)
+        await future
+
+    @ha_callback
+    def _discard_writes(self, writes):
+        """Puts back the attributes queued by a transaction that raised"""
+        for key in writes:
+            if key in self._pending_writes:
+                # Still queued by another caller
+                setattr(self, key, self._pending_writes[key])
+            else:
+                self._optimistic.pop(key, None)
+                setattr(self, key, self._server_value(key))
+        if writes:
+            _LOGGER.debug(f"{self._tag} Discarded the writes of {list(writes)}")
+            self.async_notify()
+        if self._pending_writes and not self._transactions:
+            self._schedule_flush()
+
+    async def set_attributes(self, **attributes):
+        _LOGGER.debug(f"{self._tag} queuing remote attributes {attributes}")
+        async with self.transaction():
+            for key, value in attributes.items():
+                self.queue_attribute(key, value)
+
+    async def set_attribute(self, key, value):
+        _LOGGER.debug(f"{self._tag} queuing remote attribute {key} to {value}")
+        await self.queue_attribute(key, value)
+
+    async def async_update_device(self, sample=True):
+        """Refresh the device, joining the refresh already in flight if any.
+
+        Only the refreshes with sample set feed the volatility and cadence of
+        the device, the targeted polls that confirm a write would skew them.
+        """
+        return await self._h.device_refreshes.run(
+            self.device_id, partial(self._async_update_device, sample)
+        )
+
+    async def _async_update_device(self, sample):
+        changed = await self._async_apply_attributes()
+        self._last_update = datetime.today().strftime("%d-%m-%Y %H:%M")
+        if sample:
+            # The first refresh always "changes" the device
+            if self._refreshed:
+                self._track_volatility(changed)
+            self._track_cadence(changed)
+        self._refreshed = True
+        self.stale = False
+        return changed
+
+    def _track_cadence(self, changed):
+        stamp = self._backend_timestamp()
+        if stamp is not None:
+            self.cadence.observe(stamp)
+        elif changed and self._refreshed:
+            # Only an upper bound of when the backend refreshed the device
+            self.cadence.observe(time())
+
+    def _backend_timestamp(self):
+        """Most recent attribute timestamp reported by the backend"""
+        return max(
+            (v.epoch for v in self._raw_attributes.values() if v.epoch is not None),
+            default=None,
+        )
+
+    def _track_volatility(self, changed):
+        """Moving average of the share of refreshes that changed the device"""
+        sample = 1.0 if changed else 0.0
+        if self.volatility is None:
+            self.volatility = sample
+        else:
+            self.volatility += VOLATILITY_ALPHA * (sample - self.volatility)
+
+    async def _async_apply_attributes(self):
+        if not await self.get_device_attributes():
+            return False
         _LOGGER.debug(
             f"{self._tag} update_device attributes: {self.supported_attributes} "
         )
-        self._last_update = datetime.today().strftime("%d-%m-%Y %H:%M")
-        for x in self.supported_attributes:
-            value = self._raw_attributes.get(x.lower(), {}).get("value", None)
+        return self._apply_server_values(self.supported_attributes)
+
+    @ha_callback
+    def async_apply_push(self, attributes):
+        """Attribute values pushed to us, {attribute: {"value": ..., "timeStampUTC": ...}}"""
+        pushed = decode_attributes(attributes)
+        self._raw_attributes.update(pushed)
+        changed = self._apply_server_values(
+            [x for x in self.supported_attributes if attribute_key(x) in pushed]
+        )
+        stamps = [v.epoch for v in pushed.values() if v.epoch is not None]
+        if stamps:
+            self.cadence.observe(max(stamps))
+        was_stale, self.stale = self.stale, False
+        if changed or was_stale:
+            self.async_notify()
+        return changed
+
+    def _apply_server_values(self, attributes):
+        changed = False
+        for x in attributes:
+            value = self._server_value(x)
+            if x in self._optimistic:
+                if not _matches(value, self._optimistic[x]):
+                    # Keep what the user asked for until it's confirmed
+                    continue
+                _LOGGER.debug(f"{self._tag} {x} confirmed to {value}")
+                del self._optimistic[x]
             if x in LOGGED_ATTRIBUTES:
                 _LOGGER.debug(f"{self._tag} setting local attribute {x} to {value}")
+            if getattr(self, x, None) != value:
+                changed = True
             setattr(self, x, value)
-        self._h.check_tarif()
+        return changed
+
+    def _server_value(self, key):
+        attribute = self._raw_attributes.get(attribute_key(key))
+        return attribute.value if attribute else None
+
+    def set_optimistic(self, attributes):
+        """Show the requested values until the device confirms them"""
+        self._optimistic.update(attributes)
+        for key, value in attributes.items():
+            setattr(self, key, value)
+
+    async def async_confirm(self, expected):
+        """Poll this device only, with a decaying rate, until it reports the
+        expected values. The values not confirmed in time are rolled back to
+        what the device reports.
+        """
+        deadline = monotonic() + WRITE_CONFIRM_TIMEOUT
+        delay = WRITE_CONFIRM_DELAY
+        try:
+            # Stop once the values are confirmed or replaced by a newer write
+            while any(self._optimistic.get(k) == v for k, v in expected.items()):
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(delay, remaining))
+                delay *= 2
+                await self.async_update_device(sample=False)
+                self.async_notify()
+        except HomeAssistantError as e:
+            _LOGGER.warning(f"{self._tag} Unable to confirm {expected}: {e}")
+        finally:
+            self.async_rollback(expected)
+
+    @ha_callback
+    def async_rollback(self, expected):
+        """Go back to what the device reports for the unconfirmed values"""
+        rollback = [
+            k for k, v in expected.items()
+            if k in self._optimistic and self._optimistic[k] == v
+        ]
+        for key in rollback:
+            _LOGGER.warning(
+                f"{self._tag} {key} wasn't confirmed, rolling back to {self._server_value(key)}"
+            )
+            del self._optimistic[key]
+            setattr(self, key, self._server_value(key))
+        if rollback:
+            self.async_notify()
+
+    @ha_callback
+    def async_add_listener(self, update_callback):
+        """Listen for updates of this device outside of the coordinator cycle"""
+        self._listeners.append(update_callback)
+
+        @ha_callback
+        def remove_listener():
+            self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    @ha_callback
+    def async_notify(self):
+        for update_callback in list(self._listeners):
+            update_callback()
 
     def __eq__(self, other):
         return self.device_id == other.device_id
@@ -9,32 +9,39 @@ _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     entities = []
-    for d in hass.data[DOMAIN].devices:
-        if d.device_type in HILO_SENSOR_CLASSES:
-            d._entity = HiloSensor(d, hass.data[DOMAIN].scan_interval)
-            entities.append(d._entity)
+    for d in hass.data[DOMAIN].devices.of_type(*HILO_SENSOR_CLASSES):
+        d._entity = HiloSensor(d, hass.data[DOMAIN].coordinator)
+        entities.append(d._entity)
     async_add_entities(entities)
 
 
 class HiloSensor(HiloBaseEntity, BinarySensorEntity):
-    def __init__(self, d, scan_interval):
-        super().__init__(d, scan_interval)
+    def __init__(self, d, coordinator):
+        super().__init__(d, coordinator)
         if d.name == "SmartEnergyMeter":
             self._name = "Defi Hilo"
         else:
             self._name = d.name
         _LOGGER.debug(
-            f"Setting up BinarySensor entity: {self._name} Scan: {scan_interval}"
+            f"Setting up BinarySensor entity: {self._name} Scan: {coordinator.update_interval}"
         )
         self._state = False
 
     @property
-    def state(self):
-        return "on" if self._state else "off"
+    def device_state_attributes(self):
+        attrs = super().device_state_attributes
+        if self.d.name == "hilo_gateway":
+            attrs.update(self.d._h.diagnostics)
+        elif self.d.name == "SmartEnergyMeter":
+            attrs["phase"] = self.d._h.event_phase
+        return attrs
 
-    async def _async_update(self):
+    @property
+    def state(self):
         if self.d.name == "SmartEnergyMeter":
-            self._state = await self.d._h.get_events()
+            state = self.d._h.event_active
         elif self.d.name == "hilo_gateway":
-            await self.d.async_update_device()
-            self._state = self.d.onlineStatus == "Online"
+            state = self._get("onlineStatus") == "Online"
+        else:
+            state = self._state
+        return "on" if state else "off"
@@ -0,0 +1,95 @@
+import hashlib
+from time import monotonic
+
+from .resilience import endpoint_family
+
+# Returned instead of the payload when a conditional GET didn't change
+NOT_MODIFIED = object()
+
+
+class ResponseCache:
+    """Read-through cache of GET responses with a TTL per endpoint family"""
+
+    def __init__(self, ttls):
+        self._ttls = ttls
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 2) if total else None,
+            "entries": len(self._entries),
+        }
+
+    def _ttl(self, url):
+        return self._ttls.get(endpoint_family(url), 0)
+
+    def get(self, url):
+        if not self._ttl(url):
+            return None
+        entry = self._entries.get(url)
+        if entry and entry[0] > monotonic():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def set(self, url, value):
+        ttl = self._ttl(url)
+        if ttl and value is not None:
+            self._entries[url] = (monotonic() + ttl, value)
+
+
+class ConditionalValidators:
+    """ETag / Last-Modified validators per URL.
+
+    When the server doesn't send any validator, a hash of the raw body
+    tells us if the response changed since the last one.
+    """
+
+    def __init__(self):
+        self._validators = {}
+        self._hashes = {}
+        self.not_modified = 0
+        self.hash_matches = 0
+
+    @property
+    def stats(self):
+        return {"not_modified": self.not_modified, "hash_matches": self.hash_matches}
+
+    def headers(self, url):
+        etag, last_modified = self._validators.get(url, (None, None))
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def unchanged(self, url, headers, raw):
+        """Stores the validators of a response, True if its content didn't change"""
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if etag or last_modified:
+            previous = self._validators.get(url)
+            self._validators[url] = (etag, last_modified)
+            self._hashes.pop(url, None)
+            if previous == (etag, last_modified):
+                self.not_modified += 1
+                return True
+            return False
+        digest = hashlib.blake2b(raw, digest_size=16).digest()
+        if self._hashes.get(url) == digest:
+            self.hash_matches += 1
+            return True
+        self._hashes[url] = digest
+        return False
+
+    def forget(self, url):
+        self._validators.pop(url, None)
+        self._hashes.pop(url, None)
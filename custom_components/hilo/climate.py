@@ -18,22 +18,21 @@ from .hilo_device import HiloBaseEntity
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     entities = []
-    for d in hass.data[DOMAIN].devices:
-        if d.device_type in CLIMATE_CLASSES:
-            d._entity = HiloClimate(d, hass.data[DOMAIN].scan_interval)
-            entities.append(d._entity)
+    for d in hass.data[DOMAIN].devices.of_type(*CLIMATE_CLASSES):
+        d._entity = HiloClimate(d, hass.data[DOMAIN].coordinator)
+        entities.append(d._entity)
     async_add_entities(entities)
     return True
 
 
 class HiloClimate(HiloBaseEntity, ClimateEntity):
-    def __init__(self, d, scan_interval):
-        super().__init__(d, scan_interval)
+    def __init__(self, d, coordinator):
+        super().__init__(d, coordinator)
         self.operations = [HVAC_MODE_HEAT, HVAC_MODE_OFF]
         self._has_operation = False
         self._temp_entity = None
         self._temp_entity_error = False
-        _LOGGER.debug(f"Setting up Climate entity: {self._name} Scan: {scan_interval}")
+        _LOGGER.debug(f"Setting up Climate entity: {self._name} Scan: {coordinator.update_interval}")
 
     @property
     def precision(self):
@@ -85,9 +84,4 @@ class HiloClimate(HiloBaseEntity, ClimateEntity):
             _LOGGER.info(
                 f"{self.d._tag} Setting temperature to {kwargs[ATTR_TEMPERATURE]}"
             )
-            await self.d.set_attribute("TargetTemperature", kwargs[ATTR_TEMPERATURE])
-            await self._async_update()
-            if kwargs[ATTR_TEMPERATURE] < self._get("CurrentTemperature", 0):
-                self.d.Heating = 100
-            else:
-                self.d.Heating = 0
+            await self._async_set_attributes(TargetTemperature=kwargs[ATTR_TEMPERATURE])
@@ -8,6 +8,16 @@ CONF_GENERATE_ENERGY_METERS = "generate_energy_meters"
 CONF_HQ_PLAN_NAME = "hq_plan_name"
 CONF_ENERGY_METER_PERIOD = "energy_meter_period"
 CONF_TARIFF_PLAN = "tariff_plan"
+CONF_MAX_CONCURRENT_UPDATES = "max_concurrent_updates"
+CONF_WRITE_DEBOUNCE = "write_debounce"
+CONF_POLL_INTERVALS = "poll_intervals"
+CONF_MIN_POLL_INTERVAL = "min_poll_interval"
+CONF_MAX_POLL_INTERVAL = "max_poll_interval"
+CONF_PUSH_UPDATES = "push_updates"
+CONF_READ_BACKEND = "read_backend"
+CONF_TRANSPORT = "transport"
+CONF_MQTT_PREFIX = "mqtt_prefix"
+CONF_CHALLENGE_POLL_INTERVALS = "challenge_poll_intervals"
 
 DEFAULT_TARIFF_PLAN = "rate d"
 
@@ -17,8 +27,114 @@ DEFAULT_ENERGY_METER_PERIOD = DAILY
 DEFAULT_HQ_PLAN_NAME = "hq_plan_name"
 DEFAULT_SCAN_INTERVAL = timedelta(seconds=60)
 DEFAULT_LIGHT_AS_SWITCH = False
+DEFAULT_PUSH_UPDATES = False
+READ_BACKENDS = ["rest", "graphql"]
+DEFAULT_READ_BACKEND = "rest"
+TRANSPORTS = ["rest", "mqtt"]
+DEFAULT_TRANSPORT = "rest"
+DEFAULT_MQTT_PREFIX = "hilo"
+# How long to wait for the retained device list when starting
+MQTT_DEVICES_TIMEOUT = timedelta(seconds=10)
+# Attributes read by the entities, the GraphQL reads only select these
+RENDERED_ATTRIBUTES = [
+    "Disconnected",
+    "OnOff",
+    "Intensity",
+    "CurrentTemperature",
+    "TargetTemperature",
+    "MaxTempSetpoint",
+    "MinTempSetpoint",
+    "Heating",
+    "Power",
+]
 MIN_SCAN_INTERVAL = timedelta(seconds=15)
+# Refresh interval per device type, the others use scan_interval
+DEFAULT_POLL_INTERVALS = {
+    "Thermostat": timedelta(seconds=60),
+    "Meter": timedelta(seconds=30),
+    "LightDimmer": timedelta(seconds=60),
+    "SmokeDetector": timedelta(minutes=15),
+    "Gateway": timedelta(minutes=5),
+}
+# Bounds of the intervals learned from how often the devices change
+DEFAULT_MIN_POLL_INTERVAL = timedelta(seconds=30)
+DEFAULT_MAX_POLL_INTERVAL = timedelta(minutes=30)
+# A device that always changes is polled ADAPTIVE_POLL_FACTOR times more
+# often than its type interval, one that never changes that many times less
+ADAPTIVE_POLL_FACTOR = 4
+# Weight of the last refresh in the volatility moving average
+VOLATILITY_ALPHA = 0.2
+# Seconds after the expected backend refresh of a device to poll it
+CADENCE_POLL_LAG = 2
+# Polls per minute allowed by the poll budget and how it's tuned: it's
+# halved when rate limited, cut by a quarter when the p95 latency (seconds)
+# or the error rate goes over target and grows by POLL_BUDGET_STEP every
+# POLL_BUDGET_PERIOD seconds otherwise
+POLL_BUDGET_MIN = 6
+POLL_BUDGET_MAX = 60
+POLL_BUDGET_STEP = 2
+POLL_BUDGET_PERIOD = 60
+POLL_LATENCY_TARGET = 2
+POLL_ERROR_TARGET = 0.1
+# A coordinator cycle doesn't wait longer than this for the devices, the
+# ones that didn't answer keep their values and are marked stale
+CYCLE_DEADLINE = timedelta(seconds=45)
+# With a local transport, the gateway and events reads of a cycle give up
+# after this, so the cloud doesn't hold the local devices back
+CLOUD_READ_TIMEOUT = timedelta(seconds=10)
+# The coordinator never wakes up more often than this to refresh due devices
+POLL_MIN_TICK = timedelta(seconds=5)
+# Phases of a Hilo challenge (event) and how the devices we care about are
+# polled during each of them, with the API rate (requests per second). The
+# intervals can be overridden by challenge_poll_intervals and are never
+# shorter than min_poll_interval
+CHALLENGE_PHASES = ["preheat", "reduction", "recovery"]
+CHALLENGE_PROFILES = {
+    "preheat": {
+        "intervals": {
+            "Meter": timedelta(seconds=15),
+            "Thermostat": timedelta(seconds=30),
+        },
+        "api_rate": 3,
+    },
+    "reduction": {
+        "intervals": {
+            "Meter": timedelta(seconds=10),
+            "Thermostat": timedelta(seconds=20),
+        },
+        "api_rate": 4,
+    },
+    "recovery": {
+        "intervals": {
+            "Meter": timedelta(seconds=15),
+            "Thermostat": timedelta(seconds=30),
+        },
+        "api_rate": 3,
+    },
+}
+# Maximum number of device attributes requests in flight during a refresh
+DEFAULT_MAX_CONCURRENT_UPDATES = 8
+# Seconds a written attribute must stay unchanged before it's sent to Hilo
+DEFAULT_WRITE_DEBOUNCE = 0.5
+# After a write, the device is polled after 1, 2, 4, ... seconds until it
+# reports the new values or the timeout expires
+WRITE_CONFIRM_DELAY = 1
+WRITE_CONFIRM_TIMEOUT = 30
+# Token bucket sized to stay well under the APIM subscription quota,
+# requests per second and burst size
+DEFAULT_API_RATE = 2
+DEFAULT_API_BURST = 10
+# Seconds a GET response is reused, by endpoint family. Device attributes
+# are never cached.
+CACHE_TTLS = {
+    "Locations": 3600,
+    "Devices": 300,
+    "Gateways/Info": 120,
+    "Events": 120,
+}
 DOMAIN = "hilo"
+SERVICE_SET_POLL_BUDGET = "set_poll_budget"
+ATTR_BUDGET = "budget"
 # To prevent issues with automations for people that already deployed
 # with the original code, the LightSwitch is dynamically added when
 # light_as_switch boolean is enabled in configuration.
@@ -44,7 +160,10 @@ CONF_TARIFF = {
     },
 }
 
+# Each period can be restricted to some weekdays (0 is monday, all days
+# when omitted) and to the WINTER_MONTHS with "winter_only": True
 CONF_HIGH_PERIODS = {
     "am": {"from": time(6, 00, 00), "to": time(9, 0, 0)},
     "pm": {"from": time(16, 0, 0), "to": time(19, 0, 0)},
 }
+WINTER_MONTHS = (12, 1, 2, 3)
@@ -0,0 +1,169 @@
+from functools import lru_cache
+import json
+import sys
+
+import homeassistant.util.dt as dt_util
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .const import CHALLENGE_PHASES
+
+# Bigger payloads are decoded in the executor to keep the event loop free
+EXECUTOR_DECODE_SIZE = 64 * 1024
+
+
+def loads(raw):
+    if orjson:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+async def async_loads(hass, raw):
+    if len(raw) >= EXECUTOR_DECODE_SIZE:
+        return await hass.async_add_executor_job(loads, raw)
+    return loads(raw)
+
+
+@lru_cache(maxsize=None)
+def attribute_key(name):
+    """Lower case and interned, the key of an attribute in the payloads"""
+    return sys.intern(name.lower())
+
+
+def _parse_timestamp(value):
+    parsed = dt_util.parse_datetime(value) if value else None
+    return parsed.timestamp() if parsed else None
+
+
+class Attribute:
+    __slots__ = ("value", "value_type", "timestamp", "_epoch")
+
+    def __init__(self, value=None, value_type=None, timestamp=None):
+        self.value = value
+        self.value_type = value_type
+        self.timestamp = timestamp
+        self._epoch = False
+
+    @classmethod
+    def from_payload(cls, entry):
+        # The gateway info also holds plain values
+        if not isinstance(entry, dict):
+            return cls(entry)
+        return cls(entry.get("value"), entry.get("valueType"), entry.get("timeStampUTC"))
+
+    @property
+    def epoch(self):
+        """timestamp in seconds since the epoch, parsed once"""
+        if self._epoch is False:
+            self._epoch = _parse_timestamp(self.timestamp)
+        return self._epoch
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Attribute)
+            and self.value == other.value
+            and self.value_type == other.value_type
+            and self.timestamp == other.timestamp
+        )
+
+    def __repr__(self):
+        return f"Attribute({self.value!r}, {self.value_type!r}, {self.timestamp!r})"
+
+
+def decode_attributes(payload):
+    """{attribute: {"value": ..., ...}} to {attribute_key: Attribute}"""
+    return {attribute_key(k): Attribute.from_payload(v) for k, v in payload.items()}
+
+
+class DeviceInfo:
+    __slots__ = (
+        "id",
+        "name",
+        "type",
+        "category",
+        "supported_attributes",
+        "settable_attributes",
+    )
+
+    def __init__(self, **kw):
+        for slot in self.__slots__:
+            setattr(self, slot, kw.get(slot))
+
+    @classmethod
+    def from_payload(cls, v):
+        supported = [
+            sys.intern(x) for x in (v.get("supportedAttributes") or "").split(", ")
+            if x and x != "None"
+        ]
+        # All devices like SmokeDetectors don't have the disconnected attribute
+        # but it can be fetched
+        if "Disconnected" not in supported:
+            supported.append("Disconnected")
+        return cls(
+            id=v.get("id"),
+            name=v.get("name"),
+            type=v.get("type"),
+            category=v.get("category"),
+            supported_attributes=supported,
+            settable_attributes=v.get("settableAttributes"),
+        )
+
+    def __repr__(self):
+        return f"DeviceInfo({self.id}, {self.name!r}, {self.type!r})"
+
+
+class GatewayInfo:
+    __slots__ = (
+        "online_status",
+        "last_status_time",
+        "zigbee_pairing_activated",
+        "zigbee_channel",
+        "firmware_version",
+    )
+
+    def __init__(self, **kw):
+        for slot in self.__slots__:
+            setattr(self, slot, kw.get(slot))
+
+    @classmethod
+    def from_payload(cls, v):
+        return cls(
+            online_status=v.get("onlineStatus"),
+            last_status_time=v.get("lastStatusTimeUtc"),
+            zigbee_pairing_activated=v.get("zigBeePairingActivated"),
+            zigbee_channel=v.get("zigBeeChannel"),
+            firmware_version=v.get("firmwareVersion"),
+        )
+
+
+class Event:
+    __slots__ = ("id", "progress", "participating", "phases")
+
+    def __init__(self, **kw):
+        for slot in self.__slots__:
+            setattr(self, slot, kw.get(slot))
+
+    @classmethod
+    def from_payload(cls, v):
+        phases = []
+        # "phases" can be null
+        dates = v.get("phases") or {}
+        for phase in CHALLENGE_PHASES:
+            start = dates.get(f"{phase}StartDateUTC")
+            end = dates.get(f"{phase}EndDateUTC")
+            if start and end:
+                phases.append(
+                    (dt_util.parse_datetime(start), dt_util.parse_datetime(end), phase)
+                )
+        return cls(
+            id=v.get("id"),
+            progress=v.get("progress", "NotInProgress"),
+            participating=v.get("isParticipating", True),
+            phases=phases,
+        )
+
+    def __repr__(self):
+        return f"Event({self.id}, {self.progress!r})"
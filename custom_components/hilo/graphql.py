@@ -0,0 +1,96 @@
+import json
+import logging
+
+from homeassistant.exceptions import HomeAssistantError
+
+from .const import RENDERED_ATTRIBUTES
+from .decode import decode_attributes
+from .scheduler import PRIORITY_POLL
+
+_LOGGER = logging.getLogger(__name__)
+
+QUERY_FIELD = (
+    'd{device_id}: deviceAttributes(locationId: $locationId, deviceId: {device_id}, '
+    'names: {names}) {{ name value valueType timeStampUTC }}'
+)
+
+
+class GraphQLReader:
+    """Reads the attributes of all the due devices in a single GraphQL query.
+
+    Only the attributes rendered by the entities are selected. The result
+    is kept per device until its async_update_device takes it or the cycle
+    ends, the devices that aren't part of the answer are read from their
+    REST endpoint as usual.
+    """
+
+    _url = "https://platform.hiloenergie.com/api/digital-twin/v3/graphql"
+
+    def __init__(self, hilo):
+        self._h = hilo
+        self._prefetched = {}
+        self.queries = 0
+        self.devices_read = 0
+        self.failures = 0
+
+    @property
+    def stats(self):
+        return {
+            "queries": self.queries,
+            "devices_read": self.devices_read,
+            "failures": self.failures,
+        }
+
+    def build_query(self, devices):
+        fields = []
+        for d in devices:
+            names = [x for x in d.supported_attributes if x in RENDERED_ATTRIBUTES]
+            fields.append(
+                QUERY_FIELD.format(device_id=d.device_id, names=json.dumps(names))
+            )
+        return "query Attributes($locationId: Int!) { %s }" % " ".join(fields)
+
+    async def async_prefetch(self, devices):
+        self._prefetched = {}
+        devices = [d for d in devices if d.device_type != "Gateway"]
+        if not devices:
+            return
+        await self._h.location_url()
+        payload = {
+            "query": self.build_query(devices),
+            "variables": {"locationId": self._h._location_id},
+        }
+        headers = {**self._h.headers, "Content-Type": "application/json"}
+        self.queries += 1
+        try:
+            req = await self._h._request(
+                self._url, "post", headers, json.dumps(payload), priority=PRIORITY_POLL
+            )
+        except HomeAssistantError as e:
+            self.failures += 1
+            _LOGGER.warning(f"GraphQL read failed, falling back to REST: {e}")
+            return
+        if not isinstance(req, dict):
+            self.failures += 1
+            _LOGGER.warning(f"Unexpected GraphQL answer: {req}")
+            return
+        for error in req.get("errors") or []:
+            _LOGGER.debug(f"GraphQL error: {error}")
+        data = req.get("data") or {}
+        for d in devices:
+            values = data.get(f"d{d.device_id}")
+            if values is None:
+                continue
+            self._prefetched[d.device_id] = decode_attributes(
+                {v["name"]: v for v in values if v.get("name")}
+            )
+        self.devices_read += len(self._prefetched)
+
+    def take(self, device_id):
+        """Attributes read for the device by the last query, if any"""
+        return self._prefetched.pop(device_id, None)
+
+    def clear(self):
+        """Forgets the attributes the cycle didn't take, a later refresh
+        must not apply them over fresher values"""
+        self._prefetched = {}
@@ -1,14 +1,15 @@
-from homeassistant.util import Throttle
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 import logging
 
 _LOGGER = logging.getLogger(__name__)
 
 
-class HiloBaseEntity:
-    def __init__(self, d, scan_interval):
+class HiloBaseEntity(CoordinatorEntity):
+    def __init__(self, d, coordinator):
+        super().__init__(coordinator)
         self._name = d.name
         self.d = d
-        self.async_update = Throttle(scan_interval)(self._async_update)
 
     @property
     def name(self):
@@ -27,20 +28,47 @@ class HiloBaseEntity:
         return self._get("last_update")
 
     @property
-    def should_poll(self) -> bool:
-        return True
+    def device_state_attributes(self):
+        volatility = self.d.volatility
+        period = self.d.cadence.period
+        return {
+            "last_update_duration": self.d.last_update_duration,
+            "stale": self.d.stale,
+            "volatility": None if volatility is None else round(volatility, 2),
+            "poll_interval": round(self.d._h.poll_interval(self.d)),
+            "backend_cadence": period and round(period),
+        }
+
+    @callback
+    def _handle_coordinator_update(self):
+        # The coordinator data holds the ids of the devices that changed
+        # during the last cycle, no need to write the state of the others
+        if self.d.device_id not in (self.coordinator.data or ()):
+            return
+        super()._handle_coordinator_update()
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self.async_on_remove(self.d.async_add_listener(self.async_write_ha_state))
 
     async def async_turn_on(self, **kwargs):
         _LOGGER.info(f"{self.d._tag} Turning on")
-        await self.d.set_attribute("OnOff", True)
+        await self._async_set_attributes(OnOff=True)
 
     async def async_turn_off(self, **kwargs):
         _LOGGER.info(f"{self.d._tag} Turning off")
-        await self.d.set_attribute("OnOff", False)
+        await self._async_set_attributes(OnOff=False)
 
-    async def _async_update(self):
-        _LOGGER.debug(f"{self.d._tag} Updating")
-        await self.d.async_update_device()
+    async def _async_set_attributes(self, **attributes):
+        """Publish the new values right away, the device confirms them in the background"""
+        self.d.set_optimistic(attributes)
+        self.d.async_notify()
+        try:
+            await self.d.set_attributes(**attributes)
+        except Exception:
+            self.d.async_rollback(attributes)
+            raise
+        self.hass.async_create_task(self.d.async_confirm(attributes))
 
     def _get(self, att, default=None):
         try:
@@ -15,17 +15,16 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     light_classes = LIGHT_CLASSES
     if hass.data[DOMAIN].light_as_switch:
         light_classes.remove("LightSwitch")
-    for d in hass.data[DOMAIN].devices:
-        if d.device_type in light_classes:
-            d._entity = HiloDimmer(d, hass.data[DOMAIN].scan_interval)
-            entities.append(d._entity)
+    for d in hass.data[DOMAIN].devices.of_type(*light_classes):
+        d._entity = HiloDimmer(d, hass.data[DOMAIN].coordinator)
+        entities.append(d._entity)
     async_add_entities(entities)
 
 
 class HiloDimmer(HiloBaseEntity, LightEntity):
-    def __init__(self, d, scan_interval):
-        super().__init__(d, scan_interval)
-        _LOGGER.debug(f"Setting up Light entity: {self._name} Scan: {scan_interval}")
+    def __init__(self, d, coordinator):
+        super().__init__(d, coordinator)
+        _LOGGER.debug(f"Setting up Light entity: {self._name} Scan: {coordinator.update_interval}")
 
     @property
     def brightness(self):
@@ -45,9 +44,10 @@ class HiloDimmer(HiloBaseEntity, LightEntity):
 
     async def async_turn_on(self, **kwargs):
         _LOGGER.info(f"{self.d._tag} Tunring on")
-        await self.d.set_attribute("OnOff", True)
+        attributes = {"OnOff": True}
         if ATTR_BRIGHTNESS in kwargs:
             _LOGGER.info(
                 f"{self.d._tag} Setting brightness to {kwargs[ATTR_BRIGHTNESS]}"
             )
-            await self.d.set_attribute("Intensity", kwargs[ATTR_BRIGHTNESS] / 255)
+            attributes["Intensity"] = kwargs[ATTR_BRIGHTNESS] / 255
+        await self._async_set_attributes(**attributes)
@@ -2,8 +2,22 @@ from collections import OrderedDict
 from datetime import timedelta
 from itertools import product
 import logging
-from homeassistant.components.utility_meter.const import DOMAIN as UTILITY_DOMAIN
-from .const import TARIFF_LIST
+from homeassistant.components.utility_meter.const import (
+    ATTR_TARIFF,
+    DOMAIN as UTILITY_DOMAIN,
+    SERVICE_SELECT_TARIFF,
+)
+from homeassistant.const import (
+    ATTR_DEVICE_CLASS,
+    ATTR_UNIT_OF_MEASUREMENT,
+    DEVICE_CLASS_ENERGY,
+    EVENT_STATE_CHANGED,
+)
+from homeassistant.core import Context, callback
+from homeassistant.helpers.entity_registry import EVENT_ENTITY_REGISTRY_UPDATED
+from homeassistant.helpers.event import async_track_point_in_time
+import homeassistant.util.dt as dt_util
+from .const import CONF_TARIFF, TARIFF_LIST, WINTER_MONTHS
 from homeassistant.components.utility_meter.sensor import (
     async_setup_platform as utility_setup_platform,
 )
@@ -130,3 +144,264 @@ class EnergyManager:
         await self._manager.async_update(self.msg)
         self.updated = False
 
+
+class TariffCalendar:
+    """High periods compiled into one slot per minute of the week.
+
+    There's one slot table for the winter months and one for the rest of
+    the year, so looking up a time is a single index.
+    """
+
+    SLOTS_PER_DAY = 24 * 60
+    SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+
+    def __init__(self, periods):
+        self._slots = {
+            True: bytearray(self.SLOTS_PER_WEEK),
+            False: bytearray(self.SLOTS_PER_WEEK),
+        }
+        for name, period in periods.items():
+            start = period["from"].hour * 60 + period["from"].minute
+            end = period["to"].hour * 60 + period["to"].minute
+            for winter, slots in self._slots.items():
+                if period.get("winter_only") and not winter:
+                    continue
+                for day in period.get("weekdays", range(7)):
+                    offset = day * self.SLOTS_PER_DAY
+                    slots[offset + start:offset + end] = b"\x01" * (end - start)
+
+    @property
+    def has_high_periods(self):
+        return any(1 in slots for slots in self._slots.values())
+
+    def _slot(self, when):
+        return when.weekday() * self.SLOTS_PER_DAY + when.hour * 60 + when.minute
+
+    def is_high(self, when):
+        return bool(self._slots[when.month in WINTER_MONTHS][self._slot(when)])
+
+    def next_boundary(self, when):
+        """Next time the high period starts or ends, or the season changes"""
+        winter = when.month in WINTER_MONTHS
+        slots = self._slots[winter]
+        slot = self._slot(when)
+        target = b"\x00" if slots[slot] else b"\x01"
+        # Doubled so the search can wrap around the end of the week
+        found = (slots + slots).find(target, slot + 1)
+        minute = when.replace(second=0, microsecond=0)
+        boundary = None
+        if found != -1:
+            boundary = minute + timedelta(minutes=found - slot)
+        month = when.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        while (month.month in WINTER_MONTHS) == winter:
+            month = (month + timedelta(days=32)).replace(day=1)
+        if boundary is None or month < boundary:
+            boundary = month
+        return boundary
+
+
+class TariffManager:
+    """Keeps the utility meters on the right tariff.
+
+    The hilo_energy utility meters and sensors are indexed once and the
+    index is maintained from the state changed and entity registry events,
+    the tariff is only evaluated when the energy used changes or when a
+    high period starts or ends. The current rate follows the tariff, and
+    is corrected when the rate sensors show up after the tariff was set.
+    """
+
+    METER_PREFIX = f"{UTILITY_DOMAIN}.hilo_energy"
+    SENSOR_PREFIX = "sensor.hilo_energy"
+    RATE_PREFIX = "sensor.hilo_rate_"
+    CURRENT_RATE = "sensor.hilo_rate_current"
+
+    def __init__(self, hilo):
+        self._h = hilo
+        self._hass = hilo._hass
+        self.base_sensor = f"sensor.hilo_energy_total_{hilo.energy_meter_period}_low"
+        self.meters = set()
+        self.sensors = set()
+        self.tarif = None
+        self._unsubs = []
+        self._unsub_boundary = None
+
+    @callback
+    def async_start(self):
+        for state in self._hass.states.async_all(UTILITY_DOMAIN):
+            self._index(state.entity_id)
+        for state in self._hass.states.async_all("sensor"):
+            self._index(state.entity_id)
+        _LOGGER.debug(
+            f"TariffManager: Tracking {len(self.meters)} meters and {len(self.sensors)} sensors"
+        )
+        self._unsubs.append(
+            self._hass.bus.async_listen(
+                EVENT_STATE_CHANGED,
+                self._async_state_changed,
+                event_filter=self._is_tracked_event,
+            )
+        )
+        self._unsubs.append(
+            self._hass.bus.async_listen(
+                EVENT_ENTITY_REGISTRY_UPDATED, self._async_registry_updated
+            )
+        )
+        self.check_tarif()
+        tarif_config = CONF_TARIFF.get(self._h.hq_plan_name, {})
+        if tarif_config.get("high", 0) > 0 and self._h.tariff_calendar.has_high_periods:
+            self._schedule_boundary()
+        return self
+
+    @callback
+    def async_stop(self):
+        while self._unsubs:
+            self._unsubs.pop()()
+        if self._unsub_boundary:
+            self._unsub_boundary()
+            self._unsub_boundary = None
+
+    @callback
+    def _schedule_boundary(self):
+        boundary = self._h.tariff_calendar.next_boundary(dt_util.now())
+        _LOGGER.debug(f"TariffManager: Next tariff boundary at {boundary}")
+        self._unsub_boundary = async_track_point_in_time(
+            self._hass, self._async_time_boundary, boundary
+        )
+
+    def _index(self, entity_id):
+        if entity_id.startswith(self.METER_PREFIX):
+            self.meters.add(entity_id)
+        elif entity_id.startswith(self.SENSOR_PREFIX) and not entity_id.endswith("_cost"):
+            self.sensors.add(entity_id)
+
+    def _unindex(self, entity_id):
+        self.meters.discard(entity_id)
+        self.sensors.discard(entity_id)
+
+    @callback
+    def _is_tracked_event(self, event):
+        return event.data["entity_id"].startswith(
+            (self.METER_PREFIX, self.SENSOR_PREFIX, self.RATE_PREFIX)
+        )
+
+    @callback
+    def _async_state_changed(self, event):
+        entity_id = event.data["entity_id"]
+        new_state = event.data.get("new_state")
+        if entity_id.startswith(self.RATE_PREFIX):
+            if new_state is not None:
+                self._update_rate()
+            return
+        if new_state is None:
+            self._unindex(entity_id)
+            return
+        if event.data.get("old_state") is None:
+            self._index(entity_id)
+            if entity_id in self.meters and self.tarif and new_state.state != self.tarif:
+                self.set_tarif([entity_id], self.tarif)
+        if entity_id == self.base_sensor:
+            self.check_tarif()
+        if entity_id in self.sensors:
+            self.fix_utility_sensor(entity_id, new_state)
+
+    @callback
+    def _async_registry_updated(self, event):
+        action = event.data["action"]
+        entity_id = event.data["entity_id"]
+        if action == "remove":
+            self._unindex(entity_id)
+        elif action == "update" and "old_entity_id" in event.data:
+            self._unindex(event.data["old_entity_id"])
+            self._index(entity_id)
+
+    @callback
+    def _async_time_boundary(self, now):
+        self.check_tarif()
+        self._schedule_boundary()
+
+    @callback
+    def check_tarif(self):
+        energy_used = self._hass.states.get(self.base_sensor)
+        if not energy_used:
+            _LOGGER.warning(f"check_tarif: Unable to find state for {self.base_sensor}")
+            return
+        plan_name = self._h.hq_plan_name
+        tarif_config = CONF_TARIFF.get(plan_name)
+        if not tarif_config:
+            _LOGGER.error(f"check_tarif: Unknown plan {plan_name}")
+            return
+        tarif = "low"
+        try:
+            if float(energy_used.state) >= tarif_config.get("low_threshold"):
+                tarif = "medium"
+        except ValueError:
+            _LOGGER.warning(f"Unable to restore a valid state of {self.base_sensor}: {energy_used.state}")
+        if tarif_config.get("high") > 0 and self._h.high_times:
+            tarif = "high"
+        if tarif == self.tarif:
+            return
+        _LOGGER.debug(
+            f"check_tarif: Current plan: {plan_name} Target Tarif: {tarif} Energy used: {energy_used.state} Peak: {self._h.high_times}"
+        )
+        self.tarif = tarif
+        self._update_rate()
+        meters = []
+        for entity in self.meters:
+            state = self._hass.states.get(entity)
+            if state and state.state != tarif:
+                meters.append(entity)
+        if meters:
+            self.set_tarif(meters, tarif)
+        for entity in self.sensors:
+            state = self._hass.states.get(entity)
+            if state:
+                self.fix_utility_sensor(entity, state)
+
+    @callback
+    def _update_rate(self):
+        """Sets the current rate to the rate of the tariff, when both sensors exist"""
+        if not self.tarif:
+            return
+        current_cost = self._hass.states.get(self.CURRENT_RATE)
+        target_cost = self._hass.states.get(f"{self.RATE_PREFIX}{self.tarif}")
+        if target_cost and current_cost and target_cost.state != current_cost.state:
+            _LOGGER.debug(
+                f"check_tarif: Updating current cost, was {current_cost.state} now {target_cost.state}"
+            )
+            self._h.set_state(self.CURRENT_RATE, target_cost.state)
+
+    @callback
+    def fix_utility_sensor(self, entity, state):
+        """not sure why this doesn't get created with a proper device_class"""
+        current_state = state.as_dict()
+        attrs = current_state.get("attributes", {})
+        if not attrs.get("source"):
+            _LOGGER.debug(f"No source entity defined on {entity}: {current_state}")
+            return
+        parent_unit = self._hass.states.get(attrs.get("source"))
+        if not parent_unit:
+            _LOGGER.warning(f"Unable to find state for parent unit: {current_state}")
+            return
+        new_attrs = {
+            ATTR_UNIT_OF_MEASUREMENT: parent_unit.as_dict()
+            .get("attributes", {})
+            .get(ATTR_UNIT_OF_MEASUREMENT),
+            ATTR_DEVICE_CLASS: DEVICE_CLASS_ENERGY,
+        }
+        if not all(a in attrs.keys() for a in new_attrs.keys()):
+            _LOGGER.warning(
+                f"Fixing utility sensor: {entity} {current_state} new_attrs: {new_attrs}"
+            )
+            self._h.set_state(entity, None, new_attrs=new_attrs, keep_state=True)
+
+    @callback
+    def set_tarif(self, entities, new):
+        """Switches all the meters with a single service call"""
+        _LOGGER.debug(f"check_tarif: Changing tarif of {entities} to {new}")
+        context = Context()
+        data = {ATTR_TARIFF: new, "entity_id": entities}
+        self._hass.async_create_task(
+            self._hass.services.async_call(
+                UTILITY_DOMAIN, SERVICE_SELECT_TARIFF, data, context=context
+            )
+        )
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+from time import monotonic
+
+import aiohttp
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import callback as ha_callback
+from homeassistant.exceptions import HomeAssistantError
+
+from .transport import RestTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+# SignalR JSON hub protocol
+RECORD_SEPARATOR = "\x1e"
+MESSAGE_INVOCATION = 1
+MESSAGE_PING = 6
+MESSAGE_CLOSE = 7
+
+
+class DeviceHubTransport(RestTransport):
+    """The Hilo cloud API, with the device values pushed by the Hilo device
+    hub (SignalR over a websocket).
+
+    The deltas are published to the subscribers as they come. While the
+    hub is connected, the devices are only polled at max_poll_interval to
+    catch what could have been missed; polling takes over again as soon
+    as the connection drops, until it's back.
+    """
+
+    _negotiate_url = "https://apim.hiloenergie.com/DeviceHub/negotiate"
+
+    def __init__(self, hilo):
+        super().__init__(hilo)
+        self._task = None
+        self._ws = None
+        self._unsub_stop = None
+        self._invocation = 0
+        self.connected = False
+        self.connects = 0
+        self.messages = 0
+        self.deltas = 0
+        self.last_message = None
+
+    @property
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "connects": self.connects,
+            "messages": self.messages,
+            "deltas": self.deltas,
+            "last_message_age": (
+                round(monotonic() - self.last_message) if self.last_message else None
+            ),
+        }
+
+    @property
+    def pushes(self):
+        return self.connected
+
+    async def async_start(self):
+        hass = self._h._hass
+        self._task = hass.async_create_task(self._async_run())
+        self._unsub_stop = hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_STOP, self._async_on_stop
+        )
+        return self
+
+    async def _async_on_stop(self, event):
+        self._unsub_stop = None
+        await self.async_stop()
+
+    async def async_stop(self):
+        if self._unsub_stop:
+            self._unsub_stop()
+            self._unsub_stop = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._set_connected(False)
+
+    async def _async_run(self):
+        attempt = 0
+        while True:
+            try:
+                await self._async_connect()
+                attempt = 0
+                await self._async_listen()
+            except asyncio.CancelledError:
+                raise
+            except (asyncio.TimeoutError, aiohttp.ClientError, HomeAssistantError, ValueError) as e:
+                _LOGGER.warning(f"Hilo device hub connection lost: {e!r}")
+            except Exception as e:
+                # Keep reconnecting whatever went wrong with this attempt
+                _LOGGER.exception(f"Unexpected error on the Hilo device hub connection: {e!r}")
+            finally:
+                if self._ws:
+                    await self._ws.close()
+                    self._ws = None
+                self._set_connected(False)
+            attempt += 1
+            delay = self._h.retry_policy.delay(attempt)
+            _LOGGER.debug(f"Reconnecting to the Hilo device hub in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _async_connect(self):
+        await self._h.refresh_token()
+        await self._h.location_url()
+        session = self._h.session
+        async with session.post(self._negotiate_url, headers=self._h.headers) as resp:
+            if resp.status != 200:
+                raise HomeAssistantError(f"Device hub negotiation returned {resp.status}")
+            negotiated = await resp.json()
+        if not isinstance(negotiated, dict) or not {"url", "accessToken"} <= negotiated.keys():
+            raise HomeAssistantError(f"Unexpected device hub negotiation answer: {negotiated}")
+        self._ws = await session.ws_connect(
+            negotiated["url"],
+            headers={"authorization": f"Bearer {negotiated['accessToken']}"},
+            heartbeat=30,
+        )
+        await self._send({"protocol": "json", "version": 1})
+        handshake = await self._ws.receive_str(timeout=self._h._timeout)
+        error = json.loads(handshake.rstrip(RECORD_SEPARATOR)).get("error")
+        if error:
+            raise HomeAssistantError(f"Device hub handshake failed: {error}")
+        self._invocation += 1
+        await self._send(
+            {
+                "type": MESSAGE_INVOCATION,
+                "invocationId": str(self._invocation),
+                "target": "SubscribeToLocation",
+                "arguments": [self._h._location_id],
+            }
+        )
+        self.connects += 1
+        self._set_connected(True)
+        _LOGGER.info("Connected to the Hilo device hub")
+
+    async def _send(self, message):
+        await self._ws.send_str(json.dumps(message) + RECORD_SEPARATOR)
+
+    async def _async_listen(self):
+        async for msg in self._ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                break
+            for frame in msg.data.split(RECORD_SEPARATOR):
+                if frame:
+                    await self._handle(json.loads(frame))
+
+    async def _handle(self, message):
+        self.messages += 1
+        self.last_message = monotonic()
+        if not isinstance(message, dict):
+            _LOGGER.debug(f"Ignoring device hub frame: {message}")
+            return
+        if message.get("type") == MESSAGE_PING:
+            await self._send({"type": MESSAGE_PING})
+        elif message.get("type") == MESSAGE_CLOSE:
+            raise HomeAssistantError(f"Device hub closed: {message.get('error')}")
+        elif message.get("target") == "DevicesValuesReceived":
+            for values in message.get("arguments") or []:
+                if isinstance(values, list):
+                    self._apply(values)
+
+    def _apply(self, values):
+        # [{
+        #     "deviceId": 123,
+        #     "locationId": 456,
+        #     "timeStampUTC": "2021-11-08T01:43:15Z",
+        #     "attribute": "CurrentTemperature",
+        #     "value": 21.5,
+        #     "valueType": "Celsius"
+        # }]
+        by_device = {}
+        for value in values:
+            if not isinstance(value, dict) or not value.get("attribute"):
+                continue
+            self.deltas += 1
+            by_device.setdefault(value.get("deviceId"), {})[value["attribute"]] = value
+        for device_id, attributes in by_device.items():
+            self._publish(device_id, attributes)
+
+    @ha_callback
+    def _set_connected(self, connected):
+        if connected == self.connected:
+            return
+        self.connected = connected
+        if not connected:
+            _LOGGER.info("Hilo device hub disconnected, polling the devices")
+        self._h.async_push_state_changed()
@@ -0,0 +1,173 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import logging
+from random import uniform
+from time import monotonic
+
+from homeassistant.exceptions import HomeAssistantError
+
+_LOGGER = logging.getLogger(__name__)
+
+# First match wins, Attributes and Gateways/Info are also under /Devices
+# and /Locations
+ENDPOINT_FAMILIES = [
+    ("oauth2", "oauth2"),
+    ("GraphQL", "/graphql"),
+    ("Events", "/Events"),
+    ("Gateways/Info", "/Gateways/Info"),
+    ("Attributes", "/Attributes"),
+    ("Devices", "/Devices"),
+    ("Locations", "/Locations"),
+]
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+def endpoint_family(url):
+    for family, marker in ENDPOINT_FAMILIES:
+        if marker in url:
+            return family
+    return "other"
+
+
+class CircuitOpenError(HomeAssistantError):
+    """Raised without calling the API while the endpoint circuit is open"""
+
+
+class RetryPolicy:
+    """Bounded retries with exponential backoff, jitter and Retry-After support"""
+
+    def __init__(self, attempts=3, base=1, factor=2, max_delay=60, jitter=0.3):
+        self.attempts = attempts
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retries = 0
+        self.exhausted = 0
+        self.backoff_seconds = 0.0
+
+    @property
+    def stats(self):
+        return {
+            "retries": self.retries,
+            "exhausted": self.exhausted,
+            "backoff_seconds": round(self.backoff_seconds, 1),
+        }
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before the retry number attempt, starting at 1"""
+        if retry_after is not None:
+            delay = min(retry_after, self.max_delay)
+        else:
+            delay = min(self.max_delay, self.base * self.factor ** (attempt - 1))
+            delay *= uniform(1 - self.jitter, 1 + self.jitter)
+        self.retries += 1
+        self.backoff_seconds += delay
+        return delay
+
+    @staticmethod
+    def parse_retry_after(value):
+        """Retry-After is either a number of seconds or an HTTP date"""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            _LOGGER.warning(f"Unable to parse Retry-After header: {value}")
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """Fails fast once an endpoint keeps failing.
+
+    After failure_threshold failed calls the circuit opens and calls are
+    rejected until reset_timeout expires. A single trial call is then let
+    through (half open), its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.rejected = 0
+        self._state = BREAKER_CLOSED
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        if (
+            self._state == BREAKER_OPEN
+            and monotonic() - self._opened_at >= self.reset_timeout
+        ):
+            return BREAKER_HALF_OPEN
+        return self._state
+
+    def before_call(self):
+        state = self.state
+        if state == BREAKER_CLOSED:
+            return
+        if state == BREAKER_HALF_OPEN and not self._trial:
+            self._trial = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError(f"Circuit open for {self.name} endpoints")
+
+    def record_success(self):
+        if self._state != BREAKER_CLOSED:
+            _LOGGER.info(f"Circuit for {self.name} endpoints is closed again")
+        self.failures = 0
+        self._state = BREAKER_CLOSED
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        trial, self._trial = self._trial, False
+        if trial or self.failures >= self.failure_threshold:
+            if self._state != BREAKER_OPEN or trial:
+                _LOGGER.warning(
+                    f"Opening circuit for {self.name} endpoints for {self.reset_timeout}s "
+                    f"after {self.failures} failures"
+                )
+            self._state = BREAKER_OPEN
+            self._opened_at = monotonic()
+
+    def release(self):
+        """The call was aborted (cancelled) and didn't tell us anything"""
+        self._trial = False
+
+
+class CircuitBreakers:
+    """One circuit breaker per endpoint family"""
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._breakers = {}
+
+    def for_url(self, url):
+        family = endpoint_family(url)
+        if family not in self._breakers:
+            self._breakers[family] = CircuitBreaker(family, **self._kwargs)
+        return self._breakers[family]
+
+    @property
+    def stats(self):
+        return {
+            name: {
+                "state": breaker.state,
+                "failures": breaker.failures,
+                "rejected": breaker.rejected,
+            }
+            for name, breaker in self._breakers.items()
+        }
@@ -0,0 +1,305 @@
+import asyncio
+from collections import deque
+import heapq
+from itertools import count
+import logging
+from statistics import median
+from time import monotonic
+
+_LOGGER = logging.getLogger(__name__)
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_EVENTS = 1
+PRIORITY_POLL = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_EVENTS: "events",
+    PRIORITY_POLL: "poll",
+}
+
+
+class RequestScheduler:
+    """Token bucket in front of the Hilo API with priority lanes.
+
+    A request takes a token when one is available and nobody is waiting,
+    otherwise it waits in line and the waiters are released by priority
+    as the bucket refills, so a user command never waits behind the
+    background polls.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._refilled = monotonic()
+        self._waiters = []
+        self._seq = count()
+        self._wakeup = None
+        self.waits = {name: 0 for name in PRIORITY_NAMES.values()}
+
+    @property
+    def stats(self):
+        self._refill()
+        return {
+            "rate": self.rate,
+            "tokens": round(self._tokens, 2),
+            "queued": len(self._waiters),
+            "waits": self.waits,
+        }
+
+    def set_rate(self, rate, burst=None):
+        self._refill()
+        self.rate = rate
+        if burst is not None:
+            self.burst = burst
+            self._tokens = min(self._tokens, burst)
+        if self._wakeup:
+            self._wakeup.cancel()
+            self._wakeup = None
+        self._schedule()
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    async def acquire(self, priority=PRIORITY_POLL):
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+        self.waits[PRIORITY_NAMES[priority]] += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._schedule()
+        await future
+
+    def _schedule(self):
+        if self._wakeup or not self._waiters:
+            return
+        delay = max(0, (1 - self._tokens) / self.rate)
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self._wakeup = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            # The caller was cancelled while waiting
+            if future.done():
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        self._schedule()
+
+
+class PollScheduler:
+    """Heap of the next time each device is due for a refresh"""
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}
+        self._seq = count()
+
+    def __contains__(self, device_id):
+        return device_id in self._due
+
+    @property
+    def stats(self):
+        next_due = self.next_due()
+        return {
+            "scheduled": len(self._due),
+            "next_due_in": round(next_due - monotonic(), 1) if next_due else None,
+        }
+
+    def schedule(self, device_id, due):
+        self._due[device_id] = due
+        heapq.heappush(self._heap, (due, next(self._seq), device_id))
+
+    def stagger(self, devices, now, interval_for):
+        """Spread the next refresh of the devices of each type over their interval"""
+        by_type = {}
+        for device in devices:
+            by_type.setdefault(device.device_type, []).append(device)
+        for group in by_type.values():
+            for i, device in enumerate(group):
+                interval = interval_for(device)
+                self.schedule(device.device_id, now + interval * (i + 1) / len(group))
+
+    def pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            when, _, device_id = heapq.heappop(self._heap)
+            # Skip the entries replaced by a later schedule()
+            if self._due.get(device_id) != when:
+                continue
+            del self._due[device_id]
+            due.append(device_id)
+        return due
+
+    def next_due(self):
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+
+class CadenceEstimator:
+    """Guesses the period and phase at which the backend refreshes a device.
+
+    The backend update instants come from the attribute timestamps, or
+    from the time we saw a change when there are none. Polls only catch
+    some of the refreshes, so the gaps between two instants are multiples
+    of the period: each gap is divided by its ratio to the shortest one
+    and the median is kept.
+    """
+
+    def __init__(self, samples=8, min_period=5):
+        self._instants = deque(maxlen=samples)
+        self._min_period = min_period
+        self.period = None
+
+    def observe(self, instant):
+        """Record a backend update instant, in seconds since the epoch"""
+        if self._instants and instant - self._instants[-1] < self._min_period:
+            return
+        self._instants.append(instant)
+        gaps = [b - a for a, b in zip(self._instants, list(self._instants)[1:])]
+        if len(gaps) < 2:
+            return
+        shortest = min(gaps)
+        self.period = median(gap / max(1, round(gap / shortest)) for gap in gaps)
+
+    def next_refresh(self, after):
+        """First expected backend refresh after the given instant"""
+        if self.period is None:
+            return None
+        elapsed = after - self._instants[-1]
+        return self._instants[-1] + (elapsed // self.period + 1) * self.period
+
+
+class PollBudget:
+    """Number of polls per minute we allow ourselves, tuned from the health
+    of the API.
+
+    The budget is cut when the API is rate limiting us, when its latency
+    or error rate goes over target, and grows back slowly while it's
+    healthy. Device intervals are stretched when the devices would need
+    more polls than the budget. An operator can pin the budget, which
+    stops the tuning until it's released.
+    """
+
+    RATE_LIMIT_HEADERS = [
+        ("X-RateLimit-Remaining", "X-RateLimit-Limit"),
+        ("X-Rate-Limit-Remaining", "X-Rate-Limit-Limit"),
+        ("RateLimit-Remaining", "RateLimit-Limit"),
+    ]
+
+    def __init__(
+        self,
+        minimum,
+        maximum,
+        latency_target,
+        error_target,
+        step,
+        period,
+        samples=100,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.error_target = error_target
+        self.step = step
+        self.period = period
+        self.budget = maximum
+        self.override = None
+        self._samples = deque(maxlen=samples)
+        self._rate_limited = False
+        self._remaining = None
+        self._adjusted = monotonic()
+        self.decreases = 0
+
+    @property
+    def current(self):
+        return self.budget if self.override is None else self.override
+
+    @property
+    def stats(self):
+        latencies = sorted(latency for latency, _ in self._samples)
+        return {
+            "budget": round(self.current, 1),
+            "override": self.override,
+            "decreases": self.decreases,
+            "latency_p50": self._percentile(latencies, 0.5),
+            "latency_p95": self._percentile(latencies, 0.95),
+            "error_rate": self._error_rate(),
+            "rate_limit_remaining": self._remaining,
+        }
+
+    @staticmethod
+    def _percentile(values, ratio):
+        if not values:
+            return None
+        return round(values[min(len(values) - 1, int(len(values) * ratio))], 3)
+
+    def _error_rate(self):
+        if not self._samples:
+            return None
+        return round(sum(1 for _, error in self._samples if error) / len(self._samples), 2)
+
+    def record(self, latency, status=None, headers={}):
+        """A response (status None when the call failed) and how long it took"""
+        error = status is None or status == 429 or status >= 500
+        self._samples.append((latency, error))
+        if status == 429:
+            self._rate_limited = True
+        for remaining, limit in self.RATE_LIMIT_HEADERS:
+            if remaining not in headers:
+                continue
+            try:
+                self._remaining = int(headers[remaining])
+                limit = int(headers.get(limit, 0))
+            except ValueError:
+                break
+            # Less than 10% of the quota left
+            if limit and self._remaining < limit / 10:
+                self._rate_limited = True
+            break
+
+    def set_override(self, budget):
+        """Pin the budget, None goes back to the tuned budget"""
+        self.override = budget
+        _LOGGER.info(f"Poll budget {'pinned to ' + str(budget) if budget else 'tuned again'}")
+
+    def adjust(self):
+        """Called every cycle, the budget moves at most once per period"""
+        now = monotonic()
+        if now - self._adjusted < self.period:
+            return
+        self._adjusted = now
+        previous = self.budget
+        latencies = sorted(latency for latency, _ in self._samples)
+        p95 = self._percentile(latencies, 0.95)
+        error_rate = self._error_rate()
+        if self._rate_limited:
+            self.budget = max(self.minimum, self.budget / 2)
+        elif (p95 is not None and p95 > self.latency_target) or (
+            error_rate is not None and error_rate > self.error_target
+        ):
+            self.budget = max(self.minimum, self.budget * 0.75)
+        else:
+            self.budget = min(self.maximum, self.budget + self.step)
+        self._rate_limited = False
+        if self.budget < previous:
+            self.decreases += 1
+            _LOGGER.warning(
+                f"Lowering the poll budget from {previous:.1f} to {self.budget:.1f} "
+                f"polls per minute (p95 {p95}s, errors {error_rate})"
+            )
+
+    def stretch(self, demand):
+        """Factor applied to the poll intervals so demand, in polls per
+        minute, fits in the budget"""
+        if not demand:
+            return 1
+        return max(1, demand / self.current)
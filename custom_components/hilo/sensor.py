@@ -23,7 +23,7 @@ import logging
 
 _LOGGER = logging.getLogger(__name__)
 from .const import DOMAIN, CONF_TARIFF
-from .managers import UtilityManager, EnergyManager
+from .managers import UtilityManager, EnergyManager, TariffManager
 from .hilo_device import HiloBaseEntity
 SENSOR_ATTRIBUTES = ["Power", "CurrentTemperature"]
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
@@ -35,30 +35,29 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     if domain_config.generate_energy_meters:
         energy_manager = await EnergyManager().init(hass, domain_config.energy_meter_period)
         utility_manager = UtilityManager(domain_config.energy_meter_period)
-    for d in domain_config.devices:
-        # We really only care about devices with a power meter or temperature
-        if "Power" in d.supported_attributes:
-            d._power_entity = PowerSensor(d, domain_config.scan_interval)
-            power_entities.append(d._power_entity)
-            # If we opt out the geneneration of meters we just create the power sensors
-            if not domain_config.generate_energy_meters:
-                continue
-            # This creates the sensor using the "integration" platform
-            d._energy_entity = EnergySensor(d)
-            energy_entities.append(d._energy_entity)
-            energy_entity = f"hilo_energy_{slugify(d.name)}"
-            if energy_entity == "hilo_energy_total":
-                _LOGGER.error(
-                    "An hilo entity can't be named 'total' because it conflicts with the generate name for the smart energy meter"
-                )
-                continue
-            if d.name == "SmartEnergyMeter":
-                energy_entity = "hilo_energy_total"
-            utility_manager.add_meter(energy_entity)
-            energy_manager.add_to_dashboard(energy_entity)
-        if "CurrentTemperature" in d.supported_attributes:
-            d._temperature_entity = TemperatureSensor(d, domain_config.scan_interval)
-            temperature_entities.append(d._temperature_entity)
+    # We really only care about devices with a power meter or temperature
+    for d in domain_config.devices.with_attribute("Power"):
+        d._power_entity = PowerSensor(d, domain_config.coordinator)
+        power_entities.append(d._power_entity)
+        # If we opt out the geneneration of meters we just create the power sensors
+        if not domain_config.generate_energy_meters:
+            continue
+        # This creates the sensor using the "integration" platform
+        d._energy_entity = EnergySensor(d)
+        energy_entities.append(d._energy_entity)
+        energy_entity = f"hilo_energy_{slugify(d.name)}"
+        if energy_entity == "hilo_energy_total":
+            _LOGGER.error(
+                "An hilo entity can't be named 'total' because it conflicts with the generate name for the smart energy meter"
+            )
+            continue
+        if d.name == "SmartEnergyMeter":
+            energy_entity = "hilo_energy_total"
+        utility_manager.add_meter(energy_entity)
+        energy_manager.add_to_dashboard(energy_entity)
+    for d in domain_config.devices.with_attribute("CurrentTemperature"):
+        d._temperature_entity = TemperatureSensor(d, domain_config.coordinator)
+        temperature_entities.append(d._temperature_entity)
 
     async_add_entities(power_entities + energy_entities + temperature_entities)
     if not domain_config.generate_energy_meters:
@@ -79,10 +78,12 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     await utility_manager.update(hass, config, async_add_entities)
     # This sends the entities to the energy dashboard
     await energy_manager.update()
+    # This keeps the utility meters on the right tariff
+    domain_config.tariff_manager = TariffManager(domain_config).async_start()
 
 class TemperatureSensor(HiloBaseEntity, Entity):
-    def __init__(self, d, scan_interval):
-        super().__init__(d, scan_interval)
+    def __init__(self, d, coordinator):
+        super().__init__(d, coordinator)
         self._name = f"{self._name}_temperature"
         _LOGGER.debug(f"Setting up TemperatureSensor entity: {self._name}")
 
@@ -102,12 +103,9 @@ class TemperatureSensor(HiloBaseEntity, Entity):
     def unit_of_measurement(self):
         return TEMP_CELSIUS
 
-    async def _async_update(self):
-        return
-
 class PowerSensor(HiloBaseEntity, Entity):
-    def __init__(self, d, scan_interval):
-        super().__init__(d, scan_interval)
+    def __init__(self, d, coordinator):
+        super().__init__(d, coordinator)
         self._name = f"{self._name}_power"
         _LOGGER.debug(f"Setting up PowerSensor entity: {self._name}")
 
@@ -127,15 +125,6 @@ class PowerSensor(HiloBaseEntity, Entity):
     def unit_of_measurement(self):
         return POWER_WATT
 
-    async def _async_update(self):
-        # Other devices are updated within their own
-        # classes. If we don't escape them, they will
-        # be double-polled
-        if self.d.device_type != "Meter":
-            return
-        _LOGGER.debug(f"{self.d._tag} Updating")
-        await self.d.async_update_device()
-
 class HiloCostSensor(RestoreEntity):
     def __init__(self, name, plan_name, amount=0):
         self.data = None
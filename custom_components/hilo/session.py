@@ -0,0 +1,83 @@
+import asyncio
+import logging
+
+import aiohttp
+from homeassistant.util.ssl import client_context
+
+_LOGGER = logging.getLogger(__name__)
+
+# oauth2 and APIM
+HILO_HOSTS = ["hilodirectoryb2c.b2clogin.com", "apim.hiloenergie.com"]
+CONNECTION_LIMIT = 16
+CONNECTION_LIMIT_PER_HOST = 8
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+
+
+class ConnectionStats:
+    """Counts new and reused connections through an aiohttp TraceConfig"""
+
+    def __init__(self):
+        self.created = 0
+        self.reused = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+
+    @property
+    def stats(self):
+        total = self.created + self.reused
+        return {
+            "created": self.created,
+            "reused": self.reused,
+            "reuse_ratio": round(self.reused / total, 2) if total else None,
+            "dns_hits": self.dns_hits,
+            "dns_misses": self.dns_misses,
+        }
+
+    def trace_config(self):
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(self._count("created"))
+        trace.on_connection_reuseconn.append(self._count("reused"))
+        trace.on_dns_cache_hit.append(self._count("dns_hits"))
+        trace.on_dns_cache_miss.append(self._count("dns_misses"))
+        return trace
+
+    def _count(self, counter):
+        async def on_signal(session, context, params):
+            setattr(self, counter, getattr(self, counter) + 1)
+
+        return on_signal
+
+
+def create_session(verify, stats):
+    """Session of a Hilo instance, kept apart from the pool Home Assistant
+    shares with the other integrations.
+
+    The connections to the Hilo hosts are kept alive, the DNS answers are
+    cached and a single SSL context is shared by both hosts.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTION_LIMIT,
+        limit_per_host=CONNECTION_LIMIT_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        use_dns_cache=True,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        ssl=client_context() if verify else False,
+        enable_cleanup_closed=True,
+    )
+    return aiohttp.ClientSession(
+        connector=connector, trace_configs=[stats.trace_config()]
+    )
+
+
+async def async_warm_up(session, timeout):
+    """Resolve and open a connection to each Hilo host ahead of the first calls"""
+
+    async def warm_up(host):
+        try:
+            async with session.head(f"https://{host}/", timeout=timeout):
+                pass
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            _LOGGER.debug(f"Unable to warm up the connection to {host}: {e!r}")
+
+    await asyncio.gather(*[warm_up(host) for host in HILO_HOSTS])
@@ -16,19 +16,18 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
         _LOGGER.warning("No switch classes found, skipping")
         return True
 
-    for d in hass.data[DOMAIN].devices:
-        if d.device_type in switch_classes:
-            d._entity = HiloSwitch(d, hass.data[DOMAIN].scan_interval)
-            entities.append(d._entity)
+    for d in hass.data[DOMAIN].devices.of_type(*switch_classes):
+        d._entity = HiloSwitch(d, hass.data[DOMAIN].coordinator)
+        entities.append(d._entity)
     async_add_entities(entities)
 
     return True
 
 
 class HiloSwitch(HiloBaseEntity, ToggleEntity):
-    def __init__(self, d, scan_interval):
-        super().__init__(d, scan_interval)
-        _LOGGER.debug(f"Setting up Switch entity: {self._name} Scan: {scan_interval}")
+    def __init__(self, d, coordinator):
+        super().__init__(d, coordinator)
+        _LOGGER.debug(f"Setting up Switch entity: {self._name} Scan: {coordinator.update_interval}")
 
     @property
     def state(self):
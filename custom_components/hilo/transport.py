@@ -0,0 +1,183 @@
+from abc import ABC, abstractmethod
+import asyncio
+import json
+import logging
+
+from homeassistant.core import callback as ha_callback
+
+from .cache import NOT_MODIFIED
+from .const import MQTT_DEVICES_TIMEOUT
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Transport(ABC):
+    """How the devices and their attributes are read and written.
+
+    pushes is True when the transport delivers the attribute changes on
+    its own, the devices are then only polled once in a while. local is
+    True when the devices are read without the Hilo cloud. Those
+    changes go to the callbacks given to async_subscribe, as
+    callback(device_id, {attribute: {"value": ...}}).
+    """
+
+    pushes = False
+    local = False
+
+    def __init__(self, hilo):
+        self._h = hilo
+        self._subscribers = []
+
+    @property
+    def stats(self):
+        return {}
+
+    async def async_start(self):
+        return self
+
+    async def async_stop(self):
+        pass
+
+    @ha_callback
+    def async_subscribe(self, callback):
+        """Calls back with the attributes pushed to us, returns the unsubscribe"""
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    @ha_callback
+    def _publish(self, device_id, attributes):
+        for callback in list(self._subscribers):
+            callback(device_id, attributes)
+
+    @abstractmethod
+    async def async_list_devices(self):
+        """Payloads of the devices, the same object when nothing changed"""
+
+    @abstractmethod
+    async def async_read_attributes(self, device, full=False):
+        """Attributes of a device, NOT_MODIFIED when they didn't change since
+        the last read unless full is set"""
+
+    @abstractmethod
+    async def async_write_attributes(self, device, attributes):
+        pass
+
+
+class RestTransport(Transport):
+    """The Hilo cloud API"""
+
+    async def async_list_devices(self):
+        return await self._h._request(f"{await self._h.location_url()}/Devices")
+
+    async def _attributes_url(self, device):
+        return f"{await self._h.location_url()}/Devices/{device.device_id}/Attributes"
+
+    async def async_read_attributes(self, device, full=False):
+        url = await self._attributes_url(device)
+        if full:
+            self._h.validators.forget(url)
+        return await self._h._request(url, conditional=True)
+
+    async def async_write_attributes(self, device, attributes):
+        url = await self._attributes_url(device)
+        data = json.dumps({k: str(v) for k, v in attributes.items()})
+        await self._h._request(url, method="put", data=data)
+
+
+class MqttTransport(Transport):
+    """Device values bridged to a local MQTT broker, for setups mirroring the
+    Zigbee traffic of the gateway.
+
+    {prefix}/devices holds the device list and {prefix}/<id>/attributes the
+    attributes of a device, both retained and shaped like the Hilo API
+    payloads. Writes are published to {prefix}/<id>/set. async_start waits
+    for the retained device list, so the first refresh sees all the devices.
+    """
+
+    pushes = True
+    local = True
+
+    def __init__(self, hilo, prefix):
+        super().__init__(hilo)
+        self._prefix = prefix
+        self._devices = []
+        self._attributes = {}
+        self._read = {}
+        self._unsubs = []
+        self._devices_received = asyncio.Event()
+        self.messages = 0
+        self.published = 0
+
+    @property
+    def stats(self):
+        return {"messages": self.messages, "published": self.published}
+
+    async def async_start(self):
+        from homeassistant.components import mqtt
+
+        hass = self._h._hass
+        self._unsubs = [
+            await mqtt.async_subscribe(hass, f"{self._prefix}/devices", self._on_devices),
+            await mqtt.async_subscribe(
+                hass, f"{self._prefix}/+/attributes", self._on_attributes
+            ),
+        ]
+        try:
+            await asyncio.wait_for(
+                self._devices_received.wait(), MQTT_DEVICES_TIMEOUT.total_seconds()
+            )
+        except asyncio.TimeoutError:
+            _LOGGER.warning(
+                f"No device list on {self._prefix}/devices, is it published as retained?"
+            )
+        return self
+
+    async def async_stop(self):
+        for unsub in self._unsubs:
+            unsub()
+        self._unsubs = []
+
+    def _decode(self, msg):
+        self.messages += 1
+        try:
+            return json.loads(msg.payload)
+        except ValueError as e:
+            _LOGGER.warning(f"Invalid payload on {msg.topic}: {e}")
+            return None
+
+    @ha_callback
+    def _on_devices(self, msg):
+        devices = self._decode(msg)
+        if isinstance(devices, list):
+            self._devices = devices
+            self._devices_received.set()
+
+    @ha_callback
+    def _on_attributes(self, msg):
+        attributes = self._decode(msg)
+        if not isinstance(attributes, dict):
+            return
+        device_id = msg.topic[len(self._prefix) + 1:].split("/")[0]
+        if device_id.isdigit():
+            device_id = int(device_id)
+        self._attributes[device_id] = attributes
+        # A device without attributes yet always reads them in full
+        self._read[device_id] = attributes
+        self._publish(device_id, attributes)
+
+    async def async_list_devices(self):
+        return self._devices
+
+    async def async_read_attributes(self, device, full=False):
+        attributes = self._attributes.get(device.device_id, {})
+        if not full and attributes and self._read.get(device.device_id) is attributes:
+            return NOT_MODIFIED
+        self._read[device.device_id] = attributes
+        return attributes
+
+    async def async_write_attributes(self, device, attributes):
+        from homeassistant.components import mqtt
+
+        payload = json.dumps({k: str(v) for k, v in attributes.items()})
+        mqtt.async_publish(self._h._hass, f"{self._prefix}/{device.device_id}/set", payload)
+        self.published += 1
@@ -0,0 +1,70 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from .common import LOCATION_ID
+
+GATEWAY = {
+    "onlineStatus": "Online",
+    "lastStatusTimeUtc": "2021-11-08T01:43:15Z",
+    "zigBeePairingActivated": False,
+    "firmwareVersion": "2.1.2",
+    "zigBeeChannel": 19,
+}
+
+
+class FakeApi:
+    """Local stand-in for the Hilo REST API of a single location"""
+
+    def __init__(self, devices, delay=0):
+        self.devices = devices
+        self.attributes = {}
+        self.delay = delay
+        self.reads = []
+        self.writes = []
+        app = web.Application()
+        location = f"/Locations/{LOCATION_ID}"
+        app.router.add_get(f"{location}/Devices", self._devices)
+        app.router.add_get(f"{location}/Devices/{{device_id}}/Attributes", self._attributes)
+        app.router.add_put(f"{location}/Devices/{{device_id}}/Attributes", self._write)
+        app.router.add_get(f"{location}/Gateways/Info", self._gateway)
+        app.router.add_get(f"/GDService{location}/Events", self._events)
+        self.server = TestServer(app)
+
+    async def start(self):
+        await self.server.start_server()
+        return self
+
+    async def close(self):
+        await self.server.close()
+
+    def attach(self, hilo):
+        """Points hilo to this API"""
+        hilo._location_urls = {
+            False: str(self.server.make_url(f"/Locations/{LOCATION_ID}")),
+            True: str(self.server.make_url(f"/GDService/Locations/{LOCATION_ID}")),
+        }
+
+    async def _devices(self, request):
+        return web.json_response(self.devices)
+
+    async def _attributes(self, request):
+        device_id = int(request.match_info["device_id"])
+        self.reads.append(device_id)
+        await asyncio.sleep(self.delay)
+        return web.json_response(
+            self.attributes.get(
+                device_id, {"CurrentTemperature": {"value": 20, "valueType": "Celsius"}}
+            )
+        )
+
+    async def _write(self, request):
+        self.writes.append((int(request.match_info["device_id"]), await request.json()))
+        return web.json_response(None)
+
+    async def _gateway(self, request):
+        return web.json_response([GATEWAY])
+
+    async def _events(self, request):
+        return web.json_response([])
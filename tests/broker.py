@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+
+def topic_matches(pattern, topic):
+    pattern, topic = pattern.split("/"), topic.split("/")
+    for i, level in enumerate(pattern):
+        if level == "#":
+            return True
+        if i >= len(topic) or level not in ("+", topic[i]):
+            return False
+    return len(pattern) == len(topic)
+
+
+class Broker:
+    """In-memory stand-in for the MQTT broker, with the async_subscribe and
+    async_publish of the Home Assistant mqtt integration.
+
+    Like a real broker, the retained messages reach a new subscriber after
+    the subscription returns.
+    """
+
+    def __init__(self):
+        self.retained = {}
+        self.published = []
+        self._subscriptions = []
+
+    @property
+    def module(self):
+        """Stands for homeassistant.components.mqtt"""
+        return SimpleNamespace(
+            async_subscribe=self.async_subscribe, async_publish=self.async_publish
+        )
+
+    @property
+    def subscriptions(self):
+        return [pattern for pattern, _ in self._subscriptions]
+
+    async def async_subscribe(self, hass, topic, msg_callback, qos=0, encoding="utf-8"):
+        subscription = (topic, msg_callback)
+        self._subscriptions.append(subscription)
+        loop = asyncio.get_running_loop()
+        for retained, payload in self.retained.items():
+            if topic_matches(topic, retained):
+                loop.call_soon(msg_callback, SimpleNamespace(topic=retained, payload=payload))
+        return lambda: self._subscriptions.remove(subscription)
+
+    def async_publish(self, hass, topic, payload, qos=0, retain=False):
+        self.published.append((topic, payload))
+        self.publish(topic, payload, retain)
+
+    def publish(self, topic, payload, retain=False):
+        if retain:
+            self.retained[topic] = payload
+        for pattern, msg_callback in list(self._subscriptions):
+            if topic_matches(pattern, topic):
+                msg_callback(SimpleNamespace(topic=topic, payload=payload))
@@ -0,0 +1,65 @@
+import asyncio
+from time import time
+
+from custom_components.hilo.api import Hilo
+from custom_components.hilo.resilience import RetryPolicy
+
+LOCATION_ID = 1
+
+
+class FakeBus:
+    def __init__(self):
+        self.listeners = []
+
+    def async_listen_once(self, event_type, listener):
+        entry = (event_type, listener)
+        self.listeners.append(entry)
+        return lambda: self.listeners.remove(entry)
+
+
+class FakeHass:
+    """What Hilo needs from Home Assistant, without the whole core"""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.bus = FakeBus()
+        self.data = {}
+
+    def async_create_task(self, target):
+        return self.loop.create_task(target)
+
+    async def async_add_executor_job(self, target, *args):
+        return await self.loop.run_in_executor(None, target, *args)
+
+
+def create_hilo(**kw):
+    """Hilo already logged in and attached to its location"""
+    h = Hilo("user", "password", FakeHass(), **kw)
+    # Retry and reconnect right away
+    h.retry_policy = RetryPolicy(base=0.01, max_delay=0.05)
+    h._access_token = "token"
+    h._token_expiration = time() + 3600
+    h._location_id = LOCATION_ID
+    h._location_urls = {
+        False: f"http://hilo.test/Locations/{LOCATION_ID}",
+        True: f"http://hilo.test/GDService/Locations/{LOCATION_ID}",
+    }
+    return h
+
+
+THERMOSTAT = {
+    "id": 10,
+    "name": "Living room",
+    "type": "Thermostat",
+    "category": "Thermostat",
+    "supportedAttributes": "CurrentTemperature, TargetTemperature, Heating",
+    "settableAttributes": "TargetTemperature",
+}
+
+
+async def async_wait_for(predicate, timeout=5):
+    async def wait():
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(wait(), timeout)
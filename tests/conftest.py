@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("homeassistant")
+
+import pytest_asyncio  # noqa: E402
+
+from .common import THERMOSTAT, create_hilo  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def hilo(request):
+    """Hilo with a thermostat, the create_hilo arguments come from the
+    hilo_options marker"""
+    marker = request.node.get_closest_marker("hilo_options")
+    h = create_hilo(**(marker.kwargs if marker else {}))
+    await h.add_device(THERMOSTAT)
+    yield h
+    await h.async_unload()
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "hilo_options(**kw): arguments of the Hilo fixture")
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+from aiohttp import WSMsgType, web
+from aiohttp.test_utils import TestServer
+
+from custom_components.hilo.push import MESSAGE_INVOCATION, RECORD_SEPARATOR
+
+
+class DeviceHub:
+    """Local stand-in for the Hilo device hub, SignalR JSON protocol over
+    an aiohttp websocket"""
+
+    def __init__(self):
+        self.app = web.Application()
+        self.app.router.add_post("/DeviceHub/negotiate", self._negotiate)
+        self.app.router.add_get("/DeviceHub", self._websocket)
+        self.server = TestServer(self.app)
+        self.negotiate_answer = None
+        self.negotiations = 0
+        self.subscriptions = []
+        self._sockets = []
+
+    @property
+    def negotiate_url(self):
+        return str(self.server.make_url("/DeviceHub/negotiate"))
+
+    async def start(self):
+        await self.server.start_server()
+        return self
+
+    async def close(self):
+        await self.drop()
+        await self.server.close()
+
+    async def _negotiate(self, request):
+        self.negotiations += 1
+        if self.negotiate_answer is not None:
+            return web.json_response(self.negotiate_answer)
+        return web.json_response(
+            {"url": str(self.server.make_url("/DeviceHub")), "accessToken": "hub-token"}
+        )
+
+    async def _websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.receive_str()
+        await ws.send_str("{}" + RECORD_SEPARATOR)
+        self._sockets.append(ws)
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                break
+            for frame in msg.data.split(RECORD_SEPARATOR):
+                if not frame:
+                    continue
+                message = json.loads(frame)
+                if message.get("target") == "SubscribeToLocation":
+                    self.subscriptions.append(message["arguments"])
+        if ws in self._sockets:
+            self._sockets.remove(ws)
+        return ws
+
+    async def send(self, message):
+        raw = message if isinstance(message, str) else json.dumps(message)
+        for ws in list(self._sockets):
+            await ws.send_str(raw + RECORD_SEPARATOR)
+
+    async def push(self, values):
+        await self.send(
+            {
+                "type": MESSAGE_INVOCATION,
+                "target": "DevicesValuesReceived",
+                "arguments": [values],
+            }
+        )
+
+    async def drop(self):
+        """Closes the connected websockets, like the hub going away"""
+        sockets, self._sockets = self._sockets, []
+        await asyncio.gather(*(ws.close() for ws in sockets))
@@ -0,0 +1,55 @@
+from time import monotonic
+
+import pytest
+import pytest_asyncio
+
+from .api import FakeApi
+from .common import THERMOSTAT
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.hilo_options(max_concurrent_updates=1)]
+
+THERMOSTATS = [{**THERMOSTAT, "id": i, "name": f"Room {i}"} for i in range(10, 14)]
+
+
+@pytest_asyncio.fixture
+async def api(hilo):
+    api = await FakeApi(THERMOSTATS, delay=0.1).start()
+    api.attach(hilo)
+    yield api
+    await api.close()
+
+
+async def test_new_devices_are_staggered_after_the_first_refresh(hilo, api):
+    await hilo.async_update()
+    end = monotonic()
+    assert set(api.reads) == {d["id"] for d in THERMOSTATS}
+    # The first slot of the thermostats is a quarter of their interval away
+    # from the end of the cycle, not from its start
+    first_slot = hilo.poll_interval(hilo.devices.get(10)) / len(THERMOSTATS)
+    assert hilo.poll_scheduler.next_due() > end + first_slot - 0.1
+
+
+async def test_targeted_polls_are_not_sampled(hilo, api):
+    api.delay = 0
+    device = hilo.devices.get(10)
+
+    def attributes(temperature, stamp):
+        return {
+            "CurrentTemperature": {
+                "value": temperature,
+                "valueType": "Celsius",
+                "timeStampUTC": stamp,
+            }
+        }
+
+    api.attributes[10] = attributes(20, "2021-11-08T01:00:00Z")
+    assert await device.async_update_device()
+    instants = list(device.cadence._instants)
+    api.attributes[10] = attributes(21, "2021-11-08T01:05:00Z")
+    assert await device.async_update_device(sample=False)
+    assert device.volatility is None
+    assert list(device.cadence._instants) == instants
+    api.attributes[10] = attributes(22, "2021-11-08T01:10:00Z")
+    assert await device.async_update_device()
+    assert device.volatility == 1
+    assert len(device.cadence._instants) == len(instants) + 1
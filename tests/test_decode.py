@@ -0,0 +1,27 @@
+import pytest
+
+from custom_components.hilo.decode import Event
+
+
+def test_event_with_null_phases():
+    event = Event.from_payload({"id": 1, "progress": "Scheduled", "phases": None})
+    assert event.phases == []
+
+
+@pytest.mark.parametrize("payload", [{"id": 1}, {"id": 1, "phases": {}}])
+def test_event_without_phases(payload):
+    assert Event.from_payload(payload).phases == []
+
+
+def test_event_phases():
+    event = Event.from_payload(
+        {
+            "id": 1,
+            "phases": {
+                "preheatStartDateUTC": "2021-12-01T10:00:00Z",
+                "preheatEndDateUTC": "2021-12-01T11:00:00Z",
+                "reductionStartDateUTC": None,
+            },
+        }
+    )
+    assert [phase for _, _, phase in event.phases] == ["preheat"]
@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import pytest
+import pytest_asyncio
+
+from .api import FakeApi
+from .common import LOCATION_ID, THERMOSTAT
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.hilo_options(read_backend="graphql")]
+
+EXPECTED_QUERY = (
+    "query Attributes($locationId: Int!) { "
+    "d10: deviceAttributes(locationId: $locationId, deviceId: 10, "
+    'names: ["CurrentTemperature", "TargetTemperature", "Heating", "Disconnected"]) '
+    "{ name value valueType timeStampUTC } }"
+)
+
+
+class GraphQLServer:
+    """Local stand-in for the digital twin GraphQL endpoint"""
+
+    def __init__(self):
+        app = web.Application()
+        app.router.add_post("/graphql", self._query)
+        self.server = TestServer(app)
+        self.requests = []
+        self.status = 200
+        self.answer = {}
+
+    async def _query(self, request):
+        self.requests.append(json.loads(await request.read()))
+        return web.json_response(self.answer, status=self.status)
+
+
+@pytest_asyncio.fixture
+async def server():
+    server = GraphQLServer()
+    await server.server.start_server()
+    yield server
+    await server.server.close()
+
+
+@pytest.fixture(autouse=True)
+def graphql_url(hilo, server):
+    hilo.graphql._url = str(server.server.make_url("/graphql"))
+
+
+async def test_reads_the_rendered_attributes(hilo, server):
+    server.answer = {
+        "data": {
+            "d10": [
+                {
+                    "name": "CurrentTemperature",
+                    "value": 21.5,
+                    "valueType": "Celsius",
+                    "timeStampUTC": "2021-11-08T01:43:15Z",
+                },
+                {"name": "TargetTemperature", "value": 22, "valueType": "Celsius"},
+            ]
+        }
+    }
+    device = hilo.devices.get(10)
+    await hilo.graphql.async_prefetch(list(hilo.devices))
+    assert server.requests == [
+        {"query": EXPECTED_QUERY, "variables": {"locationId": LOCATION_ID}}
+    ]
+    assert await device.async_update_device()
+    assert device.CurrentTemperature == 21.5
+    assert device.TargetTemperature == 22
+    assert hilo.graphql.stats == {"queries": 1, "devices_read": 1, "failures": 0}
+
+
+async def test_errors_fall_back_to_rest(hilo, server):
+    server.answer = {"errors": [{"message": "Unknown field deviceAttributes"}], "data": None}
+    await hilo.graphql.async_prefetch(list(hilo.devices))
+    assert hilo.graphql.take(10) is None
+
+    server.status = 500
+    await hilo.graphql.async_prefetch(list(hilo.devices))
+    assert hilo.graphql.take(10) is None
+    assert hilo.graphql.failures == 1
+
+
+async def test_cycle_forgets_what_it_did_not_take(hilo, server):
+    api = await FakeApi([THERMOSTAT], delay=0.5).start()
+    try:
+        api.attach(hilo)
+        server.answer = {"data": {"d10": [{"name": "CurrentTemperature", "value": 18}]}}
+        device = hilo.devices.get(10)
+        # Like a confirm poll after a write, the cycle refresh joins it
+        in_flight = asyncio.ensure_future(device.async_update_device())
+        await asyncio.sleep(0)
+        await hilo.async_update()
+        await in_flight
+        assert device.CurrentTemperature == 20
+        assert hilo.graphql.take(10) is None
+    finally:
+        await api.close()
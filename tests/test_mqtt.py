@@ -0,0 +1,96 @@
+from datetime import timedelta
+import json
+import logging
+import sys
+
+import homeassistant.components
+import pytest
+
+from custom_components.hilo import transport
+
+from .broker import Broker
+from .common import THERMOSTAT
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.hilo_options(transport="mqtt")]
+
+HEATER = {**THERMOSTAT, "id": 11, "name": "Bedroom"}
+
+
+def attributes(temperature):
+    return {
+        "CurrentTemperature": {
+            "value": temperature,
+            "valueType": "Celsius",
+            "timeStampUTC": "2021-11-08T01:43:15Z",
+        },
+    }
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = Broker()
+    monkeypatch.setitem(sys.modules, "homeassistant.components.mqtt", broker.module)
+    monkeypatch.setattr(homeassistant.components, "mqtt", broker.module, raising=False)
+    return broker
+
+
+async def test_waits_for_the_retained_devices(hilo, broker):
+    broker.publish("hilo/devices", json.dumps([THERMOSTAT, HEATER]), retain=True)
+    broker.publish("hilo/11/attributes", json.dumps(attributes(19.5)), retain=True)
+    await hilo.transport.async_start()
+    assert await hilo.transport.async_list_devices() == [THERMOSTAT, HEATER]
+    await hilo.add_device(HEATER)
+    heater = hilo.devices.get(11)
+    assert await heater.async_update_device()
+    assert heater.CurrentTemperature == 19.5
+
+
+@pytest.fixture
+def cloud_down(hilo):
+    """Nothing answers on the Hilo cloud, the location isn't known yet"""
+    hilo._location_id = None
+    hilo._location_urls = {}
+    hilo._automation_url = hilo._gd_service_url = "http://127.0.0.1:9"
+
+
+async def test_runs_without_the_cloud(hilo, broker, cloud_down):
+    broker.publish("hilo/devices", json.dumps([THERMOSTAT, HEATER]), retain=True)
+    broker.publish("hilo/10/attributes", json.dumps(attributes(21)), retain=True)
+    broker.publish("hilo/11/attributes", json.dumps(attributes(19.5)), retain=True)
+    await hilo.transport.async_start()
+    assert await hilo.async_update() == {10, 11}
+    assert hilo.devices.get(10).CurrentTemperature == 21
+    assert hilo.devices.get(11).CurrentTemperature == 19.5
+    assert [d.device_type for d in hilo.devices] == ["Thermostat", "Thermostat"]
+
+
+async def test_start_without_devices(hilo, broker, monkeypatch, caplog):
+    monkeypatch.setattr(transport, "MQTT_DEVICES_TIMEOUT", timedelta(seconds=0.05))
+    with caplog.at_level(logging.WARNING):
+        await hilo.transport.async_start()
+    assert "No device list on hilo/devices" in caplog.text
+    assert await hilo.transport.async_list_devices() == []
+
+
+async def test_applies_pushed_attributes(hilo, broker):
+    broker.publish("hilo/devices", json.dumps([THERMOSTAT]), retain=True)
+    await hilo.transport.async_start()
+    device = hilo.devices.get(10)
+    broker.publish("hilo/10/attributes", json.dumps(attributes(22)))
+    assert device.CurrentTemperature == 22
+    assert hilo.poll_interval(device) == hilo.max_poll_interval
+    # Already applied, the next poll has nothing new
+    assert not await device.async_update_device()
+    # Unknown devices are ignored
+    broker.publish("hilo/99/attributes", json.dumps(attributes(22)))
+    broker.publish("hilo/10/attributes", "not json")
+    assert hilo.transport.stats == {"messages": 4, "published": 0}
+
+
+async def test_writes_and_stop(hilo, broker):
+    broker.publish("hilo/devices", json.dumps([THERMOSTAT]), retain=True)
+    await hilo.transport.async_start()
+    await hilo.transport.async_write_attributes(hilo.devices.get(10), {"TargetTemperature": 21})
+    assert broker.published == [("hilo/10/set", json.dumps({"TargetTemperature": "21"}))]
+    await hilo.transport.async_stop()
+    assert not broker.subscriptions
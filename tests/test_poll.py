@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+import pytest
+
+from .common import THERMOSTAT
+
+pytestmark = pytest.mark.asyncio
+
+METER = {
+    "id": 20,
+    "name": "SmartEnergyMeter",
+    "type": "Meter",
+    "category": "Meter",
+    "supportedAttributes": "Power",
+    "settableAttributes": "",
+}
+
+
+async def test_challenge_intervals_respect_min_poll_interval(hilo):
+    await hilo.add_device(METER)
+    hilo.event_phase = "reduction"
+    assert hilo.poll_interval(hilo.devices.get(20)) == hilo.min_poll_interval
+    assert hilo.poll_interval(hilo.devices.get(THERMOSTAT["id"])) == hilo.min_poll_interval
+
+
+@pytest.mark.hilo_options(
+    min_poll_interval=timedelta(seconds=15),
+    challenge_poll_intervals={"reduction": {"Thermostat": timedelta(seconds=120)}},
+)
+async def test_challenge_intervals_are_configurable(hilo):
+    await hilo.add_device(METER)
+    hilo.event_phase = "reduction"
+    assert hilo.poll_interval(hilo.devices.get(20)) == 15
+    assert hilo.poll_interval(hilo.devices.get(THERMOSTAT["id"])) == 120
+    hilo.event_phase = "preheat"
+    assert hilo.poll_interval(hilo.devices.get(THERMOSTAT["id"])) == 30
@@ -0,0 +1,81 @@
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+import pytest
+import pytest_asyncio
+
+from custom_components.hilo.push import DeviceHubTransport
+
+from .common import LOCATION_ID, async_wait_for
+from .hub import DeviceHub
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.hilo_options(push_updates=True)]
+
+
+def delta(attribute, value, device_id=10):
+    return {
+        "deviceId": device_id,
+        "locationId": LOCATION_ID,
+        "timeStampUTC": "2021-11-08T01:43:15Z",
+        "attribute": attribute,
+        "value": value,
+        "valueType": "Celsius",
+    }
+
+
+@pytest_asyncio.fixture
+async def hub():
+    hub = await DeviceHub().start()
+    yield hub
+    await hub.close()
+
+
+@pytest.fixture
+def push(hilo, hub):
+    assert isinstance(hilo.transport, DeviceHubTransport)
+    hilo.transport._negotiate_url = hub.negotiate_url
+    return hilo.transport
+
+
+async def test_applies_pushed_values(hilo, hub, push):
+    await push.async_start()
+    await async_wait_for(lambda: hub.subscriptions)
+    assert hub.subscriptions == [[LOCATION_ID]]
+    assert push.connected
+    await hub.push([delta("CurrentTemperature", 21.5), delta("Unknown", 1, device_id=99)])
+    device = hilo.devices.get(10)
+    await async_wait_for(lambda: getattr(device, "CurrentTemperature", None) == 21.5)
+    assert push.deltas == 2
+
+
+async def test_reconnects_when_dropped(hilo, hub, push):
+    await push.async_start()
+    await async_wait_for(lambda: push.connected)
+    await hub.drop()
+    await async_wait_for(lambda: push.connects == 2 and push.connected)
+    await hub.push([delta("CurrentTemperature", 19)])
+    await async_wait_for(lambda: getattr(hilo.devices.get(10), "CurrentTemperature", None) == 19)
+
+
+async def test_survives_unexpected_answers(hilo, hub, push):
+    hub.negotiate_answer = {"unexpected": True}
+    await push.async_start()
+    await async_wait_for(lambda: hub.negotiations >= 2)
+    assert not push.connected
+    hub.negotiate_answer = None
+    await async_wait_for(lambda: push.connected)
+    # Frames that aren't objects, or with values that aren't lists
+    await hub.send("[1, 2]")
+    await hub.send({"type": 1, "target": "DevicesValuesReceived", "arguments": [None]})
+    await hub.push([delta("CurrentTemperature", 23)])
+    await async_wait_for(lambda: getattr(hilo.devices.get(10), "CurrentTemperature", None) == 23)
+    assert push.connects == 1
+
+
+async def test_stop(hilo, hub, push):
+    await push.async_start()
+    await async_wait_for(lambda: push.connected)
+    assert hilo.poll_interval(hilo.devices.get(10)) == hilo.max_poll_interval
+    await push.async_stop()
+    assert not push.connected
+    assert not push.pushes
+    assert push._task is None
+    assert EVENT_HOMEASSISTANT_STOP not in [e for e, _ in hilo._hass.bus.listeners]
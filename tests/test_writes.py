@@ -0,0 +1,52 @@
+import pytest
+import pytest_asyncio
+
+from .api import FakeApi
+from .common import THERMOSTAT
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.hilo_options(write_debounce=0.01)]
+
+
+@pytest_asyncio.fixture
+async def api(hilo):
+    api = await FakeApi([THERMOSTAT]).start()
+    api.attach(hilo)
+    yield api
+    await api.close()
+
+
+@pytest.fixture
+def device(hilo):
+    return hilo.devices.get(THERMOSTAT["id"])
+
+
+async def test_transaction_sends_a_single_put(device, api):
+    outside = device.queue_attribute("Heating", 1)
+    async with device.transaction():
+        device.queue_attribute("TargetTemperature", 21)
+        device.queue_attribute("TargetTemperature", 22)
+    await outside
+    assert api.writes == [(10, {"Heating": "1", "TargetTemperature": "22"})]
+
+
+async def test_raising_transaction_keeps_the_other_writes(device, api):
+    outside = device.queue_attribute("Heating", 1)
+    with pytest.raises(RuntimeError):
+        async with device.transaction():
+            device.queue_attribute("TargetTemperature", 21)
+            device.queue_attribute("Heating", 0)
+            raise RuntimeError
+    assert device.TargetTemperature is None
+    # Back to the value still queued outside the transaction
+    assert device.Heating == 1
+    await outside
+    assert api.writes == [(10, {"Heating": "1"})]
+
+
+async def test_nested_transactions(device, api):
+    async with device.transaction():
+        async with device.transaction():
+            device.queue_attribute("TargetTemperature", 21)
+        assert not api.writes
+        device.queue_attribute("Heating", 1)
+    assert api.writes == [(10, {"TargetTemperature": "21", "Heating": "1"})]